@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import subprocess as sp
+
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import cross_platform_popen_params, ffmpeg_escape_filename
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from PIL import Image
+
+INDEX_FILE = "asset_index.json"
+INDEX_VERSION = 1
+
+# Folder and file types covered by the index
+ASSET_FOLDERS = {
+    'image': ("images", ('.jpg', '.jpeg', '.png', '.webp', '.bmp')),
+    'video': ("videos", ('.mp4', '.mov', '.avi', '.mkv')),
+    'music': ("music", ('.mp3', '.wav', '.m4a', '.aac', '.ogg', '.flac')),
+}
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 of the file contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def measure_loudness(path):
+    """Mean volume of the audio track in dB, as reported by ffmpeg volumedetect."""
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-i", ffmpeg_escape_filename(path),
+           "-vn", "-af", "volumedetect", "-f", "null", "-"]
+    popen_params = cross_platform_popen_params(
+        {"stdout": sp.DEVNULL, "stderr": sp.PIPE, "stdin": sp.DEVNULL}
+    )
+    proc = sp.Popen(cmd, **popen_params)
+    _, err = proc.communicate()
+    match = re.search(r"mean_volume:\s*(-?[\d.]+|-inf) dB", err.decode("utf8", "replace"))
+    if match is None or match.group(1) == "-inf":
+        return None
+    return float(match.group(1))
+
+
+def probe_keyframes(path):
+    """Presentation times (seconds) of the keyframes of the video stream, in order.
+
+    ffmpeg decodes the keyframes only (``-skip_frame nokey``), but all of
+    them, so this is a pass over the whole file. ``refresh`` never calls
+    it; only files a reel is windowed from get probed.
+    """
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-skip_frame", "nokey", "-i", ffmpeg_escape_filename(path),
+           "-an", "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"]
+    popen_params = cross_platform_popen_params(
+        {"stdout": sp.DEVNULL, "stderr": sp.PIPE, "stdin": sp.DEVNULL}
+    )
+    proc = sp.Popen(cmd, **popen_params)
+    _, err = proc.communicate()
+    times = [float(t) for t in re.findall(r"pts_time:\s*(-?[\d.]+)", err.decode("utf8", "replace"))]
+    return sorted(set(times))
+
+
+def probe_asset(path, kind):
+    """Return the metadata of one asset. Images are read with PIL, media with ffmpeg."""
+    if kind == 'image':
+        with Image.open(path) as img:
+            return {'width': img.size[0], 'height': img.size[1]}
+
+    infos = ffmpeg_parse_infos(path)
+    entry = {
+        'duration': infos.get('duration'),
+        'has_audio': infos.get('audio_found', False),
+    }
+    if infos.get('video_found') and kind == 'video':
+        width, height = infos['video_size']
+        if abs(infos.get('video_rotation', 0)) in (90, 270):
+            width, height = height, width
+        entry.update({
+            'width': width,
+            'height': height,
+            'fps': infos.get('video_fps'),
+            'video_duration': infos.get('video_duration'),
+            'bitrate': infos.get('video_bitrate'),
+        })
+    if entry['has_audio']:
+        entry['loudness'] = measure_loudness(path)
+    return entry
+
+
+def is_usable(entry):
+    """True if the probe succeeded and the file has the stream its kind needs."""
+    if entry.get('error'):
+        return False
+    if entry['kind'] == 'video':
+        return 'width' in entry
+    if entry['kind'] == 'music':
+        return entry.get('has_audio', False)
+    return True
+
+
+class AssetIndex:
+    """Persistent metadata for the files in images/, videos/ and music/.
+
+    Probed duration, resolution, fps, audio presence and loudness are stored
+    in ``asset_index.json`` with each file's size and mtime. ``refresh()``
+    only probes files that are new or changed, so reading metadata normally
+    costs one ``os.stat`` per file instead of an ffmpeg launch.
+    """
+
+    def __init__(self, index_file=INDEX_FILE, folders=None):
+        self.index_file = index_file
+        self.folders = folders or {kind: folder for kind, (folder, _) in ASSET_FOLDERS.items()}
+        self.assets = {}
+        try:
+            with open(index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                # Paths are keys in their normalized form only
+                self.assets = {os.path.normpath(path): entry
+                               for path, entry in data['assets'].items()}
+        except (OSError, ValueError):
+            pass
+
+    def refresh(self, verbose=False):
+        """Probe new or modified files and forget deleted ones. Returns True if anything changed."""
+        changed = False
+        seen = set()
+
+        for kind, folder in self.folders.items():
+            extensions = ASSET_FOLDERS[kind][1]
+            names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+            for name in names:
+                if not name.lower().endswith(extensions):
+                    continue
+                path = os.path.normpath(os.path.join(folder, name))
+                stat = os.stat(path)
+                seen.add(path)
+
+                entry = self.assets.get(path)
+                if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                    continue
+
+                if verbose:
+                    print(f"   🔍 Probing {path}")
+                entry = {'kind': kind, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+                try:
+                    entry.update(probe_asset(path, kind))
+                    entry['error'] = None
+                except Exception as e:
+                    entry['error'] = str(e)
+                self.assets[path] = entry
+                changed = True
+
+        # Forget deleted files, leaving entries of folders not scanned here alone
+        scanned = {os.path.normpath(folder) for folder in self.folders.values()}
+        for path in [p for p in self.assets if os.path.dirname(p) in scanned and p not in seen]:
+            del self.assets[path]
+            changed = True
+
+        if changed:
+            self.save()
+        return changed
+
+    def save(self):
+        tmp_path = f"{self.index_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({'version': INDEX_VERSION, 'assets': self.assets}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_file)
+
+    def get(self, path):
+        return self.assets.get(os.path.normpath(path))
+
+    def digest(self, path):
+        """Content digest of ``path``, hashed once per file version and kept in the index."""
+        entry = self.get(path)
+        if entry is None:
+            return file_digest(path)
+        stat = os.stat(path)
+        if entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            # Changed since the last refresh, don't trust (or store) anything
+            return file_digest(path)
+        if not entry.get('digest'):
+            entry['digest'] = file_digest(path)
+            self.save()
+        return entry['digest']
+
+    def keyframes(self, path, probe=True):
+        """Keyframe times of the video ``path``, probed once per file version and kept in the index.
+
+        With ``probe=False`` only already known keyframes are returned, None
+        otherwise.
+        """
+        entry = self.get(path)
+        fresh = False
+        if entry is not None:
+            stat = os.stat(path)
+            fresh = entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size
+        if not fresh:
+            return probe_keyframes(path) if probe else None
+        if entry.get('keyframes') is None:
+            if not probe:
+                return None
+            entry['keyframes'] = probe_keyframes(path)
+            self.save()
+        return entry['keyframes']
+
+    def files(self, kind, valid_only=True):
+        """Paths of the indexed files of ``kind`` in its folder, skipping unusable ones by default.
+
+        An index file shared with other folders also holds their entries,
+        those are left out.
+        """
+        folder = self.folders.get(kind)
+        if folder is None:
+            return []
+        folder = os.path.normpath(folder)
+        return sorted(path for path, entry in self.assets.items()
+                      if entry['kind'] == kind and os.path.dirname(path) == folder
+                      and (not valid_only or is_usable(entry)))
@@ -0,0 +1,51 @@
+import hashlib
+import os
+
+import numpy as np
+from moviepy import AudioArrayClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import ffmpeg_escape_filename, subprocess_call
+
+CACHE_DIR = os.path.join(".cache", "audio")
+AUDIO_FPS = 44100
+NCHANNELS = 2
+
+
+def _cache_path(path, fps, cache_dir):
+    stat = os.stat(path)
+    spec = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{fps}|{NCHANNELS}"
+    key = hashlib.sha1(spec.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key + ".f32")
+
+
+def load_music(path, fps=AUDIO_FPS, cache_dir=CACHE_DIR):
+    """Return the decoded samples of ``path`` as a read-only memory map.
+
+    The track is decoded once by ffmpeg to raw float32 PCM at ``fps`` (stereo)
+    under ``cache_dir``. Later calls, from this or any other process, map the
+    file instead of decoding the MP3 again. The result has shape (n, 2).
+    """
+    pcm_path = _cache_path(path, fps, cache_dir)
+    if not os.path.exists(pcm_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{pcm_path}.{os.getpid()}.tmp"
+        subprocess_call([
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-i", ffmpeg_escape_filename(path), "-vn",
+            "-f", "f32le", "-acodec", "pcm_f32le",
+            "-ar", str(fps), "-ac", str(NCHANNELS),
+            tmp_path,
+        ], logger=None)
+        os.replace(tmp_path, pcm_path)
+
+    return np.memmap(pcm_path, dtype=np.float32, mode="r").reshape(-1, NCHANNELS)
+
+
+def music_clip(samples, start=0, end=None, fps=AUDIO_FPS):
+    """AudioArrayClip playing ``samples`` from ``start`` to ``end`` seconds.
+
+    The clip wraps a slice of the memory map, so no audio data is copied.
+    """
+    first = int(round(start * fps))
+    last = None if end is None else int(round(end * fps))
+    return AudioArrayClip(samples[first:last], fps)
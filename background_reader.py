@@ -0,0 +1,309 @@
+import bisect
+import queue
+import subprocess as sp
+import threading
+import warnings
+
+import numpy as np
+from moviepy import AudioFileClip, VideoClip, VideoFileClip
+from moviepy.decorators import outplace
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import cross_platform_popen_params, ffmpeg_escape_filename
+from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader
+
+# Frames read into reused buffers; a frame stays valid until this many more are read
+FRAME_BUFFERS = 2
+
+# Frames decoded ahead by the prefetch thread of the video background scripts
+PREFETCH_FRAMES = 4
+
+
+def output_size(source_size, crop=None, width=None, height=None, upscale=True):
+    """Size of the frames after cropping and scaling ``source_size``.
+
+    ``crop`` is (x, y, width, height) in source pixels. With only one of
+    ``width``/``height`` the aspect ratio is kept. With ``upscale=False`` a
+    frame that is already small enough is left at its size.
+    """
+    w, h = (crop[2], crop[3]) if crop else source_size
+    if width and height:
+        target = (width, height)
+    elif width:
+        target = (width, int(h * width / w))
+    elif height:
+        target = (int(w * height / h), height)
+    else:
+        return (w, h)
+
+    if not upscale and target[0] >= w and target[1] >= h:
+        return (w, h)
+    return target
+
+
+class ScaledVideoReader(FFMPEG_VideoReader):
+    """FFMPEG_VideoReader that crops and scales inside the ffmpeg decode.
+
+    moviepy's ``clip.resized()`` receives every full resolution frame over the
+    pipe and resizes it with PIL. Here the crop and scale are part of the
+    ``-vf`` filter chain, so frames arrive at their final size and no Python
+    resize is needed.
+
+    Frames are read straight into a ring of preallocated writable arrays
+    instead of a new bytes object and read-only array per frame, so they can
+    be drawn on in place (see ``StaticOverlay.apply_to``).
+
+    With ``prefetch=N`` a thread keeps decoding up to N frames ahead into a
+    bounded queue while the caller composites the current frame, so pipe
+    reads and composition overlap. ``threads`` limits the ffmpeg decoder
+    threads (default: ffmpeg's choice, one per core).
+
+    With ``pixel_format='yuv420p'`` frames are planar I420 arrays of shape
+    (height * 3 // 2, width) straight from the decoder, with no conversion
+    to RGB; the size is then rounded down to even numbers.
+
+    ``keyframes`` (the keyframe times of the file, see
+    ``AssetIndex.keyframes``) makes seeks start decoding at the keyframe
+    right before the wanted frame, instead of 1 second before it. That
+    saves decoding up to one GOP per seek; for a start on a keyframe, none
+    of the frames before it are decoded.
+    """
+
+    def __init__(self, filename, width=None, height=None, crop=None, upscale=True,
+                 resize_algo="bicubic", prefetch=0, threads=None, keyframes=None, **kwargs):
+        self.keyframes = keyframes
+        self.crop = crop
+        self.prefetch = prefetch
+        self.threads = threads
+        self.held_frames = FRAME_BUFFERS
+        self._target = (width, height, upscale)
+        self._buffers = []
+        self._next_buffer = 0
+        self._queue = None
+        self._thread = None
+        self._stop = None
+        self._prefetch_done = False
+        FFMPEG_VideoReader.__init__(self, filename, resize_algo=resize_algo, **kwargs)
+
+    def initialize(self, start_time=0):
+        if self._target is not None:
+            # First call, from FFMPEG_VideoReader.__init__: self.size is the
+            # (rotated) source size, turn it into the output size
+            width, height, upscale = self._target
+            self._target = None
+            self.source_size = tuple(self.size)
+            self.size = output_size(self.source_size, self.crop, width, height, upscale)
+            if self.pixel_format == 'yuv420p':
+                # Chroma is subsampled 2x2, so the planes need even dimensions
+                self.size = (self.size[0] - self.size[0] % 2, self.size[1] - self.size[1] % 2)
+            self.bufsize = int(np.prod(self.frame_shape)) + 100
+
+        self.close(delete_lastread=False)
+        self.pos = self.get_frame_number(start_time)
+
+        popen_params = cross_platform_popen_params(
+            {"bufsize": self.bufsize, "stdout": sp.PIPE, "stderr": sp.PIPE, "stdin": sp.DEVNULL}
+        )
+        self.proc = sp.Popen(self.build_command(), **popen_params)
+
+        if self.prefetch:
+            self._queue = queue.Queue(maxsize=self.prefetch)
+            self._stop = threading.Event()
+            self._prefetch_done = False
+            self._thread = threading.Thread(target=self._decode_ahead,
+                                            args=(self.proc, self._queue, self._stop), daemon=True)
+            self._thread.start()
+
+        self.last_read = self.read_frame()
+
+    @property
+    def frame_shape(self):
+        w, h = self.size
+        if self.pixel_format == 'yuv420p':
+            # The Y plane, then the quarter size U and V planes
+            return (h * 3 // 2, w)
+        return (h, w, self.depth)
+
+    def hold_frames(self, n):
+        """Keep each frame valid until ``n`` more frames have been read.
+
+        For callers that queue frames, like the render pipeline. The ring
+        grows with the next read; it never shrinks.
+        """
+        self.held_frames = max(self.held_frames, n)
+
+    def _read_into_next_buffer(self, proc):
+        # The prefetch queue holds ``prefetch`` frames and the thread fills
+        # one more on top of the frames held by the caller
+        n_buffers = self.held_frames + (self.prefetch + 1 if self.prefetch else 0)
+        while len(self._buffers) < n_buffers:
+            # New buffers go before the next one to overwrite, so the frames
+            # handed out most recently stay untouched the longest
+            self._buffers.insert(self._next_buffer, np.empty(self.frame_shape, dtype=np.uint8))
+        frame = self._buffers[self._next_buffer]
+        nbytes = proc.stdout.readinto(memoryview(frame).cast("B")) or 0
+        if nbytes == frame.nbytes:
+            self._next_buffer = (self._next_buffer + 1) % len(self._buffers)
+        return frame, nbytes
+
+    def _decode_ahead(self, proc, frames, stop):
+        """Prefetch thread: read frames in order until the stream ends or the reader seeks."""
+        while not stop.is_set():
+            try:
+                frame, nbytes = self._read_into_next_buffer(proc)
+            except (OSError, ValueError):
+                frame, nbytes = None, 0  # Pipe closed by close()
+            frames.put((frame, nbytes))  # Blocks while the queue is full
+            if frame is None or nbytes != frame.nbytes:
+                return
+
+    def _next_frame(self):
+        if not self.prefetch:
+            return self._read_into_next_buffer(self.proc)
+        if self._prefetch_done:
+            return None, 0
+        frame, nbytes = self._queue.get()
+        if frame is None or nbytes != frame.nbytes:
+            self._prefetch_done = True
+        return frame, nbytes
+
+    def skip_frames(self, n=1):
+        """Read and throw away n frames."""
+        for _ in range(n):
+            self._next_frame()
+        self.pos += n
+
+    def read_frame(self):
+        """Read the next frame into the next buffer of the ring."""
+        frame, nbytes = self._next_frame()
+
+        if frame is not None and nbytes == frame.nbytes:
+            self.last_read = frame
+        else:
+            # Same handling as moviepy: repeat the last complete frame
+            if not hasattr(self, "last_read"):
+                raise IOError(f"MoviePy error: failed to read the first frame of video file "
+                              f"{self.filename}. That might mean that the file is corrupted.")
+            nbytes_wanted = int(np.prod(self.frame_shape))
+            warnings.warn(f"In file {self.filename}, {nbytes_wanted} bytes wanted but {nbytes} "
+                          f"bytes read at frame index {self.pos} (out of a total {self.n_frames} "
+                          f"frames), at time {self.pos / self.fps:.02f}/{self.duration:.02f} sec. "
+                          f"Using the last valid frame instead.", UserWarning)
+        self.pos += 1
+        return self.last_read
+
+    def get_frame(self, t):
+        if not self.proc:
+            # Released (see release_frames): reopen the file at t
+            self.initialize(t)
+            return self.last_read
+        return FFMPEG_VideoReader.get_frame(self, t)
+
+    def close(self, delete_lastread=True):
+        if self._thread is not None:
+            # Unblock the prefetch thread: ffmpeg exiting ends its read, and
+            # draining the queue ends its put
+            self._stop.set()
+            if self.proc.poll() is None:
+                self.proc.terminate()
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._thread = None
+            self._queue = None
+            self.proc.stdout.close()
+            self.proc.stderr.close()
+            self.proc.wait()
+        FFMPEG_VideoReader.close(self, delete_lastread)
+
+    def release_frames(self):
+        """Stop ffmpeg and free the frame ring until the next ``get_frame``.
+
+        Call it before reusing the reader: the buffered frames may have been
+        drawn on by their previous user, and the ring may have grown for a
+        caller that held many frames (see ``hold_frames``).
+        """
+        self.close()
+        self._buffers = []
+        self._next_buffer = 0
+        self.held_frames = FRAME_BUFFERS
+
+    def input_args(self):
+        """ffmpeg arguments that open the file at frame ``self.pos``."""
+        # Same seeking rule as moviepy: subtract an epsilon so ffmpeg returns
+        # the frame displayed at that time rather than the next one
+        threads = [] if self.threads is None else ["-threads", str(self.threads)]
+        if self.pos == 0:
+            return threads + ["-i", ffmpeg_escape_filename(self.filename)]
+        start_time = self.pos * (1 / self.fps) - 0.00001
+        i = bisect.bisect_right(self.keyframes or [], start_time)
+        if i:
+            # Input seeking lands on that keyframe exactly; the frames from
+            # there to the wanted one are decoded and dropped
+            keyframe = self.keyframes[i - 1]
+            return threads + ["-ss", "%.06f" % keyframe,
+                              "-i", ffmpeg_escape_filename(self.filename),
+                              "-ss", "%.06f" % (start_time - keyframe)]
+        offset = min(1, start_time)
+        return threads + ["-ss", "%.06f" % (start_time - offset),
+                "-i", ffmpeg_escape_filename(self.filename),
+                "-ss", "%.06f" % offset]
+
+    def filters(self):
+        """The ``-vf`` filter chain applied while decoding."""
+        chain = []
+        if self.crop:
+            chain.append("crop=%d:%d:%d:%d" % (self.crop[2], self.crop[3], self.crop[0], self.crop[1]))
+        if tuple(self.size) != self.source_size or not chain:
+            chain.append("scale=%d:%d" % tuple(self.size))
+        return chain
+
+    def build_command(self):
+        return (
+            [FFMPEG_BINARY]
+            + self.input_args()
+            + ["-loglevel", "error", "-f", "image2pipe",
+               "-vf", ",".join(self.filters()),
+               "-sws_flags", self.resize_algo,
+               "-pix_fmt", self.pixel_format,
+               "-vcodec", "rawvideo", "-"]
+        )
+
+
+class BackgroundVideoClip(VideoFileClip):
+    """A VideoFileClip whose frames are cropped and scaled by ffmpeg.
+
+    Accepts the same ``width``, ``height``, ``crop`` and ``upscale`` options as
+    ScaledVideoReader. Everything else behaves like VideoFileClip, except
+    that with ``pixel_format='yuv420p'`` the frames are I420 arrays only
+    the render pipeline understands.
+    """
+
+    def __init__(self, filename, width=None, height=None, crop=None, upscale=True, audio=True,
+                 audio_fps=44100, audio_nbytes=2, audio_buffersize=200000, **reader_options):
+        VideoClip.__init__(self)
+
+        self.reader = ScaledVideoReader(filename, width=width, height=height, crop=crop,
+                                        upscale=upscale, **reader_options)
+
+        self.duration = self.reader.duration
+        self.end = self.reader.duration
+        self.fps = self.reader.fps
+        self.size = self.reader.size
+        self.rotation = self.reader.rotation
+        self.filename = filename
+
+        self.frame_function = lambda t: self.reader.get_frame(t)
+
+        if audio and self.reader.infos["audio_found"]:
+            self.audio = AudioFileClip(filename, buffersize=audio_buffersize,
+                                       fps=audio_fps, nbytes=audio_nbytes)
+
+    @outplace
+    def with_updated_frame_function(self, frame_function):
+        self.frame_function = frame_function
+        # moviepy takes the size from the shape of the first frame, which
+        # for I420 frames is not the picture size
+        if self.reader.pixel_format != 'yuv420p':
+            self.size = self.get_frame(0).shape[:2][::-1]
@@ -0,0 +1,49 @@
+import random
+
+from text_placement import analyze_brightness
+
+# Windows compared when the start is picked by analysis
+ANALYSIS_CANDIDATES = 5
+
+
+def window_starts(keyframes, video_duration, window):
+    """Keyframe times a window of ``window`` seconds can start at and still fit in the video."""
+    return [t for t in keyframes if t >= 0 and t + window <= video_duration] or [0.0]
+
+
+def text_contrast(path, start, window):
+    """How far the best text region of the window is from medium brightness (lower is better).
+
+    Uses the same criterion as the enhanced script's text placement, on the
+    cached brightness analysis.
+    """
+    brightness = analyze_brightness(path, start, window)
+    return min(abs(value - 128) for value in brightness.values())
+
+
+def pick_start(index, path, window, mode='random', candidates=ANALYSIS_CANDIDATES, rng=random):
+    """Start (seconds) of a ``window`` seconds long excerpt of the video ``path``.
+
+    Starts are keyframe times from the asset ``index`` (probed here for
+    this file only, once), so a reader with keyframe seeking decodes no
+    frame before the window. ``mode`` is 'random', or
+    'analysis' to take, out of ``candidates`` evenly spread windows, the
+    one where the text will be easiest to read. Videos no longer than the
+    window (or not in the index) start at 0.
+    """
+    entry = index.get(path)
+    if entry is None:
+        return 0.0
+    video_duration = entry.get('video_duration') or entry.get('duration') or 0
+    if video_duration <= window:
+        return 0.0
+
+    starts = window_starts(index.keyframes(path), video_duration, window)
+    if mode == 'random':
+        return rng.choice(starts)
+    if mode == 'analysis':
+        if len(starts) > candidates:
+            starts = [starts[round(i * (len(starts) - 1) / (candidates - 1))]
+                      for i in range(candidates)]
+        return min(starts, key=lambda start: text_contrast(path, start, window))
+    raise ValueError(f"Unknown start mode '{mode}', use 'random' or 'analysis'")
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+
+import create_video
+import create_video_enhanced
+import create_video_with_video_bg
+import create_video_with_video_bg_enhanced
+from cpu_budget import CpuBudget
+from reel_assets import AssetCache
+from render_cache import MAX_CACHE_BYTES, cached_render, render_key
+
+# Which script renders each kind of reel
+SCRIPTS = {
+    'basic': create_video,
+    'enhanced': create_video_enhanced,
+    'video_bg': create_video_with_video_bg,
+    'video_bg_enhanced': create_video_with_video_bg_enhanced,
+}
+
+output_folder = "batch_output"
+
+# Module settings of the scripts that change what a render produces
+SCRIPT_SETTINGS = ('max_duration', 'tune_export', 'background_start', 'yuv_pipeline')
+
+
+def make_random_jobs(count, script, assets, output_folder=output_folder):
+    """Build ``count`` jobs with random background, music and proverb."""
+    module = SCRIPTS[script]
+    jobs = []
+    for i in range(count):
+        background, music, proverb = module.pick_inputs(assets)
+        jobs.append({
+            'script': script,
+            'background': background,
+            'music': music,
+            'proverb': proverb,
+            'output': os.path.join(output_folder, f"{script}_{i + 1:04d}.mp4"),
+        })
+    return jobs
+
+
+def load_manifest(manifest_path, assets, output_folder=output_folder):
+    """Read a JSON list of jobs. Missing background/music/proverb are picked at random.
+
+    An entry may set ``cpus``, the number of CPU cores its render may use.
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    jobs = []
+    for i, entry in enumerate(entries):
+        script = entry.get('script', 'enhanced')
+        if script not in SCRIPTS:
+            raise ValueError(f"Unknown script '{script}' in manifest entry {i + 1}")
+        job = {key: entry[key] for key in ('background', 'music', 'proverb') if key in entry}
+        if len(job) < 3:
+            background, music, proverb = SCRIPTS[script].pick_inputs(assets)
+            job = {'background': background, 'music': music, 'proverb': proverb, **job}
+        if 'cpus' in entry:
+            job['cpus'] = int(entry['cpus'])
+        jobs.append({
+            'script': script,
+            **job,
+            'output': entry.get('output', os.path.join(output_folder, f"{script}_{i + 1:04d}.mp4")),
+        })
+    return jobs
+
+
+def render_spec(job):
+    """The render cache spec of ``job``: script, proverb and the script's current settings.
+
+    None when the render is not reproducible (a random background start),
+    so it must not be cached.
+    """
+    module = SCRIPTS[job['script']]
+    spec = {'script': job['script'], 'proverb': job['proverb']}
+    for name in SCRIPT_SETTINGS:
+        if hasattr(module, name):
+            spec[name] = getattr(module, name)
+    if spec.get('background_start') == 'random':
+        return None
+    return spec
+
+
+def render_job(job, assets, logger="bar", cache_bytes=MAX_CACHE_BYTES, budget=None):
+    """Render one job and return a result record (never raises).
+
+    Identical jobs (same script and settings, input files and proverb) are
+    served from the render cache; ``cache_bytes=None`` disables it, and so
+    does a random background start. The job's own ``cpus``
+    take precedence over the default CpuBudget ``budget``.
+    """
+    started = time.time()
+    if 'cpus' in job:
+        budget = CpuBudget(job['cpus'], sliced_threads=budget is not None and budget.sliced_threads)
+    try:
+        output_dir = os.path.dirname(job['output'])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        def render():
+            SCRIPTS[job['script']].render_reel(job['background'], job['music'], job['proverb'],
+                                               job['output'], assets=assets, logger=logger,
+                                               budget=budget)
+
+        spec = render_spec(job)
+        if cache_bytes is None or spec is None:
+            render()
+            cached = False
+        else:
+            key = render_key(spec, {'background': job['background'], 'music': job['music']},
+                             digest=assets.index.digest)
+            cached = cached_render(key, job['output'], render, max_bytes=cache_bytes)
+        return {'output': job['output'], 'ok': True, 'cached': cached,
+                'seconds': time.time() - started}
+    except Exception as e:
+        return {'output': job['output'], 'ok': False, 'seconds': time.time() - started,
+                'error': str(e)}
+
+
+def _status(result):
+    if not result['ok']:
+        return f"❌ {result['error']}"
+    return "✅ (cached)" if result['cached'] else "✅"
+
+
+def run_batch(jobs, assets, logger="bar", cache_bytes=MAX_CACHE_BYTES, budget=None):
+    """Render every job in this process, sharing the loaded assets."""
+    results = []
+    for i, job in enumerate(jobs):
+        result = render_job(job, assets, logger=logger, cache_bytes=cache_bytes, budget=budget)
+        status = _status(result)
+        print(f"[{i + 1}/{len(jobs)}] {result['output']} ({result['seconds']:.1f}s) {status}")
+        results.append(result)
+    return results
+
+
+# Each pool worker keeps its own asset cache for its whole lifetime
+_worker_assets = None
+_worker_cache_bytes = MAX_CACHE_BYTES
+_worker_budget = None
+
+
+def _init_worker(cache_bytes, budget):
+    global _worker_assets, _worker_cache_bytes, _worker_budget
+    _worker_assets = AssetCache()
+    _worker_cache_bytes = cache_bytes
+    _worker_budget = budget
+    # Pool workers leave through os._exit, which skips atexit handlers but
+    # runs multiprocessing finalizers
+    Finalize(None, _worker_assets.close, exitpriority=10)
+
+
+def _render_in_worker(job):
+    result = render_job(job, _worker_assets, logger=None, cache_bytes=_worker_cache_bytes,
+                        budget=_worker_budget)
+    result['worker'] = os.getpid()
+    return result
+
+
+def run_parallel_batch(jobs, workers, cache_bytes=MAX_CACHE_BYTES, budget=None):
+    """Fan the jobs out to ``workers`` processes, each with a warm asset cache.
+
+    Each job runs within ``budget`` (default: an even share of the cores
+    per worker), so the renders don't oversubscribe the host. Results are
+    returned in job order; progress is printed as reels finish.
+    """
+    budget = budget or CpuBudget.share(workers)
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache_bytes, budget)) as pool:
+        futures = {pool.submit(_render_in_worker, job): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. killed by the OOM killer)
+                result = {'output': jobs[i]['output'], 'ok': False, 'seconds': 0.0,
+                          'error': f"worker crashed: {e}"}
+            status = _status(result)
+            print(f"[{done}/{len(jobs)}] {result['output']} ({result['seconds']:.1f}s) {status}")
+            results[i] = result
+    return results
+
+
+def print_report(results, elapsed):
+    succeeded = [r for r in results if r['ok']]
+    failed = [r for r in results if not r['ok']]
+
+    print("\n📊 Batch Report:")
+    print(f"   Rendered: {len(succeeded)}/{len(results)} reels in {elapsed:.1f} seconds")
+    if results:
+        print(f"   Throughput: {len(results) / elapsed * 60:.1f} reels/minute")
+        render_seconds = sum(r['seconds'] for r in results)
+        print(f"   Render time: {render_seconds:.1f} seconds total, "
+              f"{render_seconds / len(results):.1f} seconds per reel")
+    cached = [r for r in succeeded if r['cached']]
+    if cached:
+        print(f"   Served from render cache: {len(cached)}")
+    workers = {r['worker'] for r in results if 'worker' in r}
+    if workers:
+        print(f"   Workers used: {len(workers)}")
+    for result in failed:
+        print(f"   ❌ {result['output']} - {result['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render many reels in one process.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--count', type=int, help="number of random reels to render")
+    source.add_argument('--manifest', help="JSON file with a list of jobs")
+    parser.add_argument('--script', choices=sorted(SCRIPTS), default='enhanced',
+                        help="reel style used with --count (default: enhanced)")
+    parser.add_argument('--output-dir', default=output_folder,
+                        help=f"where generated reels go (default: {output_folder})")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of render processes, 0 for one per CPU core (default: 1)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always render, never reuse identical earlier renders")
+    parser.add_argument('--cache-size', type=int, default=MAX_CACHE_BYTES // (1024 * 1024),
+                        help="render cache size limit in MB (default: %(default)s)")
+    parser.add_argument('--cpus-per-job', type=int, default=0,
+                        help="CPU cores each render may use, 0 for an even share of the host "
+                             "between the workers (default: 0)")
+    parser.add_argument('--sliced-threads', action='store_true',
+                        help="let x264 thread within frames instead of across them (less memory)")
+    parser.add_argument('--quiet', action='store_true', help="hide the per-frame progress bars")
+    args = parser.parse_args()
+
+    logger = None if args.quiet else "bar"
+    workers = args.workers or os.cpu_count() or 1
+    cache_bytes = None if args.no_cache else args.cache_size * 1024 * 1024
+    started = time.time()
+
+    with AssetCache() as assets:
+        if args.manifest:
+            jobs = load_manifest(args.manifest, assets, args.output_dir)
+        else:
+            jobs = make_random_jobs(args.count, args.script, assets, args.output_dir)
+
+        if workers > 1 and len(jobs) > 1:
+            # Progress bars from several processes would interleave, so only
+            # the per-reel progress lines are shown in parallel mode
+            workers = min(workers, len(jobs))
+            budget = (CpuBudget(args.cpus_per_job, sliced_threads=args.sliced_threads)
+                      if args.cpus_per_job
+                      else CpuBudget.share(workers, sliced_threads=args.sliced_threads))
+            print(f"🎬 Rendering {len(jobs)} reel(s) on {workers} worker processes")
+            results = run_parallel_batch(jobs, workers, cache_bytes, budget)
+        else:
+            print(f"🎬 Rendering {len(jobs)} reel(s)")
+            budget = None
+            if args.cpus_per_job or args.sliced_threads:
+                budget = CpuBudget(args.cpus_per_job or os.cpu_count() or 1,
+                                   sliced_threads=args.sliced_threads)
+            results = run_batch(jobs, assets, logger=logger, cache_bytes=cache_bytes, budget=budget)
+
+    print_report(results, time.time() - started)
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
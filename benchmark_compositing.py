@@ -0,0 +1,67 @@
+import argparse
+import time
+
+import numpy as np
+from moviepy import CompositeVideoClip, VideoClip
+
+from create_video_with_video_bg_enhanced import (create_dynamic_text_background,
+                                                 create_enhanced_video_text,
+                                                 position_text_block)
+from overlay_compositor import flatten_overlay
+
+proverb = "The best time to plant a tree was 20 years ago. The second best time is now."
+
+
+def make_background(size, duration, fps, distinct_frames=8):
+    """An animated stand-in for a decoded background video (read-only frames, like the reader's)."""
+    w, h = size
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (h, w, 3), dtype=np.uint8) for _ in range(distinct_frames)]
+    for frame in frames:
+        frame.flags.writeable = False
+    return VideoClip(lambda t: frames[int(t * fps) % distinct_frames], duration=duration)
+
+
+def measure(clip, n_frames, fps):
+    """Frames per second of ``clip.get_frame`` over ``n_frames`` consecutive frames."""
+    clip.get_frame(0)  # Warm up (text rasterization, buffer allocation)
+    started = time.perf_counter()
+    for i in range(n_frames):
+        clip.get_frame(i / fps)
+    return n_frames / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare moviepy's CompositeVideoClip with the numpy overlay compositor.")
+    parser.add_argument('--frames', type=int, default=120, help="frames per measurement")
+    parser.add_argument('--width', type=int, default=1080)
+    parser.add_argument('--height', type=int, default=1920)
+    args = parser.parse_args()
+
+    fps = 30
+    size = (args.width, args.height)
+    duration = args.frames / fps
+    background = make_background(size, duration, fps)
+
+    text_clips = create_enhanced_video_text(proverb, duration, video_size=size)
+    text_with_bg = create_dynamic_text_background(text_clips)
+    overlays = position_text_block(text_with_bg, size, ('center', 0.5))
+
+    moviepy_clip = CompositeVideoClip([background] + overlays, size=size)
+    numpy_clip = flatten_overlay(overlays, size).apply_to(background)
+
+    # Both paths must produce the same picture (up to rounding)
+    difference = np.abs(moviepy_clip.get_frame(0).astype(np.int16)
+                        - numpy_clip.get_frame(0).astype(np.int16)).max()
+
+    print(f"🎬 {args.frames} frames at {size[0]}x{size[1]}, {len(overlays)} text lines")
+    moviepy_fps = measure(moviepy_clip, args.frames, fps)
+    print(f"   CompositeVideoClip:  {moviepy_fps:8.1f} frames/sec")
+    numpy_fps = measure(numpy_clip, args.frames, fps)
+    print(f"   Overlay compositor:  {numpy_fps:8.1f} frames/sec ({numpy_fps / moviepy_fps:.1f}x)")
+    print(f"   Max pixel difference: {difference}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import os
-from moviepy import VideoFileClip
+from asset_index import AssetIndex
 
 def check_video_setup():
     videos_folder = "videos"
@@ -9,8 +9,10 @@ def check_video_setup():
         print("❌ Videos folder doesn't exist yet")
         return False
     
-    # Check for video files
-    video_files = [f for f in os.listdir(videos_folder) if f.endswith(('.mp4', '.mov', '.avi', '.mkv'))]
+    # Probe new or changed files only, everything else comes from asset_index.json
+    index = AssetIndex()
+    index.refresh(verbose=True)
+    video_files = index.files('video', valid_only=False)
     
     if not video_files:
         print("❌ No video files found in 'videos' folder")
@@ -18,16 +20,20 @@ def check_video_setup():
         return False
     
     print(f"✅ Found {len(video_files)} video file(s):")
-    for video in video_files:
-        video_path = os.path.join(videos_folder, video)
-        try:
-            # Try to load video to check if it's valid
-            with VideoFileClip(video_path) as clip:
-                duration = clip.duration
-                size = clip.size
-            print(f"   📹 {video} - Duration: {duration:.1f}s, Size: {size[0]}x{size[1]}")
-        except Exception as e:
-            print(f"   ❌ {video} - Error: {str(e)}")
+    for video_path in video_files:
+        video = os.path.basename(video_path)
+        info = index.get(video_path)
+        if info['error']:
+            print(f"   ❌ {video} - Error: {info['error']}")
+        elif 'width' not in info:
+            print(f"   ❌ {video} - Error: no video stream found")
+        else:
+            audio = "with audio" if info['has_audio'] else "no audio"
+            # ffmpeg doesn't report a duration or frame rate for every file
+            duration = "unknown" if info['duration'] is None else f"{info['duration']:.1f}s"
+            fps = "unknown" if info['fps'] is None else f"{info['fps']:g}"
+            print(f"   📹 {video} - Duration: {duration}, Size: {info['width']}x{info['height']}, "
+                  f"{fps} fps, {audio}")
     
     return True
 
@@ -0,0 +1,74 @@
+import os
+
+# Codecs configured through -x264-params
+X264_CODECS = ('libx264', 'libx264rgb')
+
+
+class CpuBudget:
+    """The number of CPU cores one render job may keep busy.
+
+    Left alone, the ffmpeg decoder and libx264 each start a thread pool sized
+    for the whole machine, so concurrent renders on one host end up with many
+    times more busy threads than cores. A budget caps the decoder threads,
+    the x264 frame threads and lookahead, and the render pipeline threads
+    of one job.
+
+    ``sliced_threads`` makes x264 split each frame into slices instead of
+    encoding several frames at once: a little less efficient, but without
+    the frames buffered per frame thread, for hosts short on memory.
+    """
+
+    def __init__(self, cores, sliced_threads=False):
+        self.cores = max(1, int(cores))
+        self.sliced_threads = sliced_threads
+
+    @classmethod
+    def share(cls, jobs, cores=None, sliced_threads=False):
+        """An even share of ``cores`` (default: all of them) among ``jobs`` concurrent renders."""
+        cores = cores or os.cpu_count() or 1
+        return cls(cores // max(1, jobs), sliced_threads=sliced_threads)
+
+    def __repr__(self):
+        return f"CpuBudget({self.cores}, sliced_threads={self.sliced_threads})"
+
+    @property
+    def pipelined(self):
+        """Whether decode, compose and encode may run concurrently in threads of their own."""
+        return self.cores > 1
+
+    @property
+    def decoder_threads(self):
+        # Decoding costs a fraction of encoding, half the budget keeps up
+        return max(1, self.cores // 2)
+
+    def decoder_params(self):
+        """ffmpeg input options sizing the decoder to the budget (before ``-i``)."""
+        return ["-threads", str(self.decoder_threads)]
+
+    def encoder_params(self, codec, ffmpeg_params=None):
+        """``ffmpeg_params`` plus the options sizing the ``codec`` encoder to the budget."""
+        params = list(ffmpeg_params or [])
+        if codec not in X264_CODECS:
+            return params + ["-threads", str(self.cores)]
+
+        # x264 defaults: rc-lookahead=40, lookahead-threads=threads/6
+        options = [f"threads={self.cores}",
+                   f"lookahead-threads={max(1, self.cores // 6)}",
+                   f"rc-lookahead={min(40, 10 + 5 * self.cores)}"]
+        if self.sliced_threads:
+            options.append("sliced-threads=1")
+        return params + ["-x264-params", ":".join(options)]
+
+
+def split_budget(budget, parts):
+    """Budgets for ``parts`` processes sharing ``budget`` (None stays None)."""
+    if budget is None:
+        return None
+    return CpuBudget(budget.cores // max(1, parts), sliced_threads=budget.sliced_threads)
+
+
+def reader_options(budget, prefetch):
+    """``AssetCache.video()`` options for a background decoded within ``budget``."""
+    if budget is None:
+        return {'prefetch': prefetch}
+    return {'prefetch': prefetch if budget.pipelined else 0, 'threads': budget.decoder_threads}
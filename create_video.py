@@ -1,37 +1,72 @@
 import random
-from moviepy import ImageClip, AudioFileClip, TextClip, CompositeVideoClip
-import os
+from moviepy import CompositeVideoClip
+from reel_assets import AssetCache
+from still_export import is_static_clip, write_still_videofile
+from streamed_export import write_streamed_videofile
+from text_cache import cached_text_clip
 
 # Paths
 images_folder = "images"
 music_folder = "music"
 proverbs_file = "proverbs.txt"
 
-# Pick random image, music, and proverb
-image_path = os.path.join(images_folder, random.choice(os.listdir(images_folder)))
-music_path = os.path.join(music_folder, random.choice(os.listdir(music_folder)))
+output_path = "motivational_video.mp4"
 
-with open(proverbs_file, "r", encoding="utf-8") as f:
-	proverbs = [line.strip() for line in f if line.strip()]
-proverb = random.choice(proverbs)
 
-# Create video clip from image
-image_clip = ImageClip(image_path).with_duration(10).resized(width=640)  # 10 seconds video, lower resolution
+def pick_inputs(assets):
+    """Pick random image, music, and proverb"""
+    image_path = random.choice(assets.image_files())
+    music_path = random.choice(assets.music_files())
+    proverb = random.choice(assets.proverbs())
+    return image_path, music_path, proverb
 
-# Create text overlay with better visibility
-txt_clip = TextClip(text=proverb, color='white', font_size=30, 
-                   stroke_color='black', stroke_width=3)
-txt_clip = txt_clip.with_position('center').with_duration(10)
 
-# Add background music
-audio_clip = AudioFileClip(music_path).subclipped(0, 10)  # first 10 seconds of music
+def render_reel(image_path, music_path, proverb, output_path=output_path, assets=None, logger="bar",
+                budget=None):
+    """Render one reel. Pass a shared AssetCache to reuse loaded files across reels.
 
-# Combine image + text
-video = CompositeVideoClip([image_clip, txt_clip])
-video = video.with_audio(audio_clip)
+    A CpuBudget passed as ``budget`` limits the threads the render starts.
+    """
+    own_assets = assets is None
+    if own_assets:
+        assets = AssetCache(images_folder=images_folder, music_folder=music_folder,
+                            proverbs_file=proverbs_file)
 
-# Export final video
-output_path = "motivational_video.mp4"
-video.write_videofile(output_path, fps=24, codec='libx264', audio_codec='aac', bitrate="1000k")
+    # Create video clip from image
+    image_clip = assets.image(image_path, width=640).with_duration(10)  # 10 seconds video, lower resolution
+
+    # Create text overlay with better visibility
+    txt_clip = cached_text_clip(text=proverb, color='white', font_size=30,
+                                stroke_color='black', stroke_width=3)
+    txt_clip = txt_clip.with_position('center').with_duration(10)
+
+    # Combine image + text
+    video = CompositeVideoClip([image_clip, txt_clip])
+
+    # Export final video. An image reel is one picture for its whole duration,
+    # so render that frame once and let ffmpeg loop it under the music, read
+    # straight from the music file
+    if is_static_clip(video):
+        write_still_videofile(video.get_frame(0), output_path, duration=10, fps=24,
+                              audio_path=music_path, codec='libx264', audio_codec='aac',
+                              bitrate="1000k", logger=logger, budget=budget)
+    else:
+        # Add background music
+        video = video.with_audio(assets.music(music_path, 0, 10))  # first 10 seconds of music
+        write_streamed_videofile(video, output_path, fps=24, codec='libx264', audio_codec='aac',
+                                 bitrate="1000k", logger=logger, budget=budget)
+
+    if own_assets:
+        assets.close()
+    return output_path
+
+
+if __name__ == "__main__":
+    assets = AssetCache(images_folder=images_folder, music_folder=music_folder,
+                        proverbs_file=proverbs_file)
+    image_path, music_path, proverb = pick_inputs(assets)
+
+    render_reel(image_path, music_path, proverb, output_path, assets=assets)
+    assets.close()
 
-print(f"Video saved as {output_path}")
\ No newline at end of file
+    print(f"Video saved as {output_path}")
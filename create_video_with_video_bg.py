@@ -1,72 +1,112 @@
 import random
-from moviepy import VideoFileClip, AudioFileClip, TextClip, CompositeVideoClip
-import os
+from background_reader import PREFETCH_FRAMES
+from cpu_budget import reader_options
+from overlay_compositor import flatten_overlay
+from reel_assets import AssetCache
+from render_pipeline import write_pipelined_videofile
+from text_cache import cached_text_clip
 
 # Paths
 videos_folder = "videos"  # Create this folder and put your video files here
 music_folder = "music"
 proverbs_file = "proverbs.txt"
 
-# Pick random background video, music, and proverb
-video_files = [f for f in os.listdir(videos_folder) if f.endswith(('.mp4', '.mov', '.avi', '.mkv'))]
-if not video_files:
-    print("No video files found in 'videos' folder!")
-    exit(1)
-
-background_video_path = os.path.join(videos_folder, random.choice(video_files))
-music_path = os.path.join(music_folder, random.choice(os.listdir(music_folder)))
-
-with open(proverbs_file, "r", encoding="utf-8") as f:
-    proverbs = [line.strip() for line in f if line.strip()]
-proverb = random.choice(proverbs)
-
-print(f"Using background video: {background_video_path}")
-print(f"Using music: {music_path}")
-print(f"Using proverb: {proverb}")
-
-# Load the background video
-background_clip = VideoFileClip(background_video_path)
-
-# Set duration (you can adjust this)
-final_duration = min(10, background_clip.duration)  # Use 10 seconds or video length, whichever is shorter
-background_clip = background_clip.subclipped(0, final_duration)
-
-# Resize video if needed (optional - for consistent output size)
-background_clip = background_clip.resized(width=640)
-
-# Create text overlay with better visibility
-txt_clip = TextClip(text=proverb, color='white', font_size=30, 
-                   stroke_color='black', stroke_width=3)
-txt_clip = txt_clip.with_position('center').with_duration(final_duration)
-
-# Add background music
-audio_clip = AudioFileClip(music_path).subclipped(0, final_duration)
-
-# Combine background video + text
-video = CompositeVideoClip([background_clip, txt_clip])
-
-# Mix the original video audio with background music (optional)
-# You can choose one of these options:
-
-# Option 1: Use only background music (replace original audio)
-video = video.with_audio(audio_clip)
-
-# Option 2: Mix original video audio with background music (commented out)
-# original_audio = background_clip.audio
-# if original_audio:
-#     mixed_audio = CompositeAudioClip([original_audio.with_volume_scaled(0.3), 
-#                                      audio_clip.with_volume_scaled(0.7)])
-#     video = video.with_audio(mixed_audio)
-# else:
-#     video = video.with_audio(audio_clip)
-
-# Export final video
 output_path = "motivational_video_with_video_bg.mp4"
-video.write_videofile(output_path, fps=24, codec='libx264', audio_codec='aac', bitrate="1000k")
-
-print(f"Video saved as {output_path}")
 
-# Clean up
-background_clip.close()
-audio_clip.close()
-video.close()
+# Decode, blend and encode in yuv420p instead of RGB: half the pipe traffic
+# and no colour conversions, the text is blended in the Y, U and V planes
+yuv_pipeline = False
+
+
+def pick_inputs(assets):
+    """Pick random background video, music, and proverb"""
+    video_files = assets.video_files()
+    if not video_files:
+        print("No video files found in 'videos' folder!")
+        exit(1)
+
+    background_video_path = random.choice(video_files)
+    music_path = random.choice(assets.music_files())
+    proverb = random.choice(assets.proverbs())
+    return background_video_path, music_path, proverb
+
+
+def render_reel(background_video_path, music_path, proverb, output_path=output_path, assets=None,
+                logger="bar", budget=None, yuv=None):
+    """Render one reel. Pass a shared AssetCache to reuse loaded files across reels.
+
+    A CpuBudget passed as ``budget`` limits the threads the render starts.
+    ``yuv`` selects the yuv420p render path (default: ``yuv_pipeline``).
+    """
+    if yuv is None:
+        yuv = yuv_pipeline
+    pixel_format = 'yuv420p' if yuv else 'rgb24'
+    own_assets = assets is None
+    if own_assets:
+        assets = AssetCache(videos_folder=videos_folder, music_folder=music_folder,
+                            proverbs_file=proverbs_file)
+
+    print(f"Using background video: {background_video_path}")
+    print(f"Using music: {music_path}")
+    print(f"Using proverb: {proverb}")
+
+    # Load the background video, resized (optional - for consistent output size)
+    # by ffmpeg while decoding, with the next frames decoded ahead in a thread
+    background_clip = assets.video(background_video_path, width=640, pixel_format=pixel_format,
+                                   fps=24, **reader_options(budget, PREFETCH_FRAMES))
+
+    # Set duration (you can adjust this)
+    final_duration = min(10, background_clip.duration)  # Use 10 seconds or video length, whichever is shorter
+    background_clip = background_clip.subclipped(0, final_duration)
+
+    # Create text overlay with better visibility
+    txt_clip = cached_text_clip(text=proverb, color='white', font_size=30,
+                                stroke_color='black', stroke_width=3)
+    txt_clip = txt_clip.with_position('center').with_duration(final_duration)
+
+    # Add background music
+    audio_clip = assets.music(music_path, 0, final_duration)
+
+    # Combine background video + text. The text never moves, so it is
+    # flattened once and blended onto each frame over its bounding box only
+    overlay = flatten_overlay([txt_clip], background_clip.size)
+    if yuv:
+        overlay = overlay.to_yuv420p(background_clip.size)
+    video = overlay.apply_to(background_clip, in_place=True)
+
+    # Mix the original video audio with background music (optional)
+    # You can choose one of these options:
+
+    # Option 1: Use only background music (replace original audio)
+    video = video.with_audio(audio_clip)
+
+    # Option 2: Mix original video audio with background music (commented out)
+    # original_audio = background_clip.audio
+    # if original_audio:
+    #     mixed_audio = CompositeAudioClip([original_audio.with_volume_scaled(0.3),
+    #                                      audio_clip.with_volume_scaled(0.7)])
+    #     video = video.with_audio(mixed_audio)
+    # else:
+    #     video = video.with_audio(audio_clip)
+
+    # Export final video: decoding, text blending and encoding run as
+    # concurrent stages, and the music is encoded while the frames are rendered
+    write_pipelined_videofile(video, output_path, fps=24, codec='libx264', audio_codec='aac',
+                              bitrate="1000k", logger=logger, budget=budget,
+                              input_pixel_format=pixel_format)
+
+    print(f"Video saved as {output_path}")
+
+    # Clean up (the background video and music are owned by the asset cache)
+    if own_assets:
+        assets.close()
+    return output_path
+
+
+if __name__ == "__main__":
+    assets = AssetCache(videos_folder=videos_folder, music_folder=music_folder,
+                        proverbs_file=proverbs_file)
+    background_video_path, music_path, proverb = pick_inputs(assets)
+
+    render_reel(background_video_path, music_path, proverb, output_path, assets=assets)
+    assets.close()
@@ -1,202 +1,192 @@
+import os
 import random
+import shutil
+import tempfile
 import textwrap
-from moviepy import VideoFileClip, AudioFileClip, TextClip, CompositeVideoClip, ColorClip, CompositeAudioClip
-import os
+from moviepy import CompositeVideoClip, ColorClip, CompositeAudioClip
+from audio_cache import load_music, music_clip
+from background_reader import PREFETCH_FRAMES
+from background_window import pick_start
+from cpu_budget import reader_options
+from encoder_tuning import tune_encoder
+from overlay_compositor import flatten_overlay
+from reel_assets import AssetCache
+from renditions import encode_renditions, resolve_renditions
+from render_pipeline import write_pipelined_videofile
+from resumable_export import encode_intermediate, spool_lossless
+from text_cache import cached_text_clip
+from text_placement import analyze_brightness
 
 # Paths
 videos_folder = "videos"
 music_folder = "music"
 proverbs_file = "proverbs.txt"
 
-# Pick random background video, music, and proverb
-video_files = [f for f in os.listdir(videos_folder) if f.endswith(('.mp4', '.mov', '.avi', '.mkv'))]
-if not video_files:
-    print("No video files found in 'videos' folder!")
-    exit(1)
-
-background_video_path = os.path.join(videos_folder, random.choice(video_files))
-
-# Use different music files for variety (skip the first one used in image version)
-music_files = [f for f in os.listdir(music_folder) if f.endswith('.mp3')]
-if len(music_files) > 1:
-    # Use a different music file than the image version typically uses
-    preferred_music = [f for f in music_files if 'marketing' not in f.lower()]
-    music_path = os.path.join(music_folder, random.choice(preferred_music if preferred_music else music_files))
-else:
-    music_path = os.path.join(music_folder, random.choice(music_files))
-
-with open(proverbs_file, "r", encoding="utf-8") as f:
-    proverbs = [line.strip() for line in f if line.strip()]
-
-# Use a different proverb selection strategy for variety
-if len(proverbs) > 1:
-    # Prefer longer, more impactful quotes for video backgrounds
-    longer_proverbs = [p for p in proverbs if len(p) > 20]
-    proverb = random.choice(longer_proverbs if longer_proverbs else proverbs)
-else:
-    proverb = random.choice(proverbs)
-
-print(f"Using background video: {background_video_path}")
-print(f"Using music: {music_path}")
-print(f"Using proverb: {proverb}")
-
-# Load the background video with enhanced settings
-background_clip = VideoFileClip(background_video_path)
-
-# Enhanced duration handling - use more of the video if it's good quality
-final_duration = min(15, background_clip.duration)  # Up to 15 seconds instead of 10
-background_clip = background_clip.subclipped(0, final_duration)
-
-# Smart resizing for better quality - maintain aspect ratio
-def smart_resize_video(clip, target_width=1080):
-    """Resize video while maintaining aspect ratio and ensuring good quality"""
-    original_width, original_height = clip.size
-    
-    # Calculate new dimensions maintaining aspect ratio
-    if original_width > target_width:
-        # Only downscale if original is larger
-        scale_factor = target_width / original_width
-        new_height = int(original_height * scale_factor)
-        return clip.resized(width=target_width, height=new_height)
+output_path = "motivational_video_with_video_bg_enhanced.mp4"
+
+# Longest reel rendered from one background video, in seconds
+max_duration = 15
+
+# Export tuning: trial-encode a sample of each reel and use the fastest x264
+# preset/CRF meeting the quality target instead of the width based bitrates
+tune_export = False
+
+# Where the reel starts in the background video: a time in seconds,
+# 'random' or 'analysis' (the window where the text reads best). Both pick
+# keyframe times of the video, so no frame before the window is decoded
+background_start = 0
+
+# Decode, blend and encode in yuv420p instead of RGB: half the pipe traffic
+# and no colour conversions, the text is blended in the Y, U and V planes
+yuv_pipeline = False
+
+# Platform versions written by one run (see renditions.py), e.g.
+# ['reels', 'shorts', 'feed']; None writes the single output_path
+output_renditions = None
+
+
+def pick_inputs(assets):
+    """Pick random background video, music, and proverb"""
+    video_files = assets.video_files()
+    if not video_files:
+        print("No video files found in 'videos' folder!")
+        exit(1)
+
+    background_video_path = random.choice(video_files)
+
+    # Use different music files for variety (skip the first one used in image version)
+    music_files = assets.music_files('.mp3')
+    if len(music_files) > 1:
+        # Use a different music file than the image version typically uses
+        preferred_music = [f for f in music_files if 'marketing' not in f.lower()]
+        music_path = random.choice(preferred_music if preferred_music else music_files)
     else:
-        # Keep original size if it's already smaller
-        return clip
+        music_path = random.choice(music_files)
 
-background_clip = smart_resize_video(background_clip, target_width=1080)
+    proverbs = assets.proverbs()
+
+    # Use a different proverb selection strategy for variety
+    if len(proverbs) > 1:
+        # Prefer longer, more impactful quotes for video backgrounds
+        longer_proverbs = [p for p in proverbs if len(p) > 20]
+        proverb = random.choice(longer_proverbs if longer_proverbs else proverbs)
+    else:
+        proverb = random.choice(proverbs)
 
-def create_enhanced_video_text(text, max_width=35, video_size=None):
+    return background_video_path, music_path, proverb
+
+def create_enhanced_video_text(text, duration, max_width=35, video_size=None):
     """Create enhanced multi-line text optimized for video backgrounds"""
     # Break text into lines with appropriate width for video
     lines = textwrap.wrap(text, width=max_width)
     text_clips = []
-    
+
     # Enhanced styling for video backgrounds
     font_size = 50 if video_size and video_size[0] >= 1080 else 40
     stroke_width = 4 if video_size and video_size[0] >= 1080 else 3
-    
+
     for i, line in enumerate(lines):
-        line_clip = TextClip(text=line, 
-                           color='white', 
-                           font_size=font_size,
-                           stroke_color='black', 
-                           stroke_width=stroke_width)
-        
+        line_clip = cached_text_clip(text=line,
+                                    color='white',
+                                    font_size=font_size,
+                                    stroke_color='black',
+                                    stroke_width=stroke_width)
+
         # FIXED: Simple center positioning for all text
-        line_clip = line_clip.with_duration(final_duration)
+        line_clip = line_clip.with_duration(duration)
         text_clips.append(line_clip)
-    
+
     return text_clips
 
 def create_dynamic_text_background(text_clips, bg_style='gradient'):
     """Create text with dark background for better visibility"""
     combined_clips = []
-    
+
     for text_clip in text_clips:
         # Create a semi-transparent black background
         bg_width = text_clip.size[0] + 40  # Add padding
         bg_height = text_clip.size[1] + 20  # Add padding
-        
+
         # Create black background
         bg_color = ColorClip(size=(bg_width, bg_height), color=(0, 0, 0))
         bg_with_opacity = bg_color.with_opacity(0.6).with_duration(text_clip.duration)
-        
+
         # Create composite with background and text, both centered
         composite = CompositeVideoClip([
             bg_with_opacity.with_position('center'),
             text_clip.with_position('center')
         ], size=text_clip.size)
-        
+
         combined_clips.append(composite)
-    
+
     return combined_clips
 
-def analyze_video_for_text_placement(video_clip, sample_points=5):
+def analyze_video_for_text_placement(video_path, start, duration, sample_points=5):
     """Analyze video content to determine optimal text placement"""
     try:
-        # Sample frames at different points in the video
-        sample_times = [i * video_clip.duration / sample_points for i in range(sample_points)]
-        
-        # Simple analysis: check brightness in different regions
-        regions_brightness = {'top': 0, 'center': 0, 'bottom': 0}
-        
-        for t in sample_times:
-            if t < video_clip.duration:
-                frame = video_clip.get_frame(t)
-                h, w = frame.shape[:2]
-                
-                # Calculate average brightness for each region
-                top_region = frame[:h//3, :]
-                center_region = frame[h//3:2*h//3, :]
-                bottom_region = frame[2*h//3:, :]
-                
-                regions_brightness['top'] += top_region.mean()
-                regions_brightness['center'] += center_region.mean()
-                regions_brightness['bottom'] += bottom_region.mean()
-        
+        # Simple analysis: check brightness in different regions, on small
+        # thumbnails decoded in one pass and cached per background file
+        avg_brightness = analyze_brightness(video_path, start, duration, sample_points)
+
         # Find the region with medium brightness (best for text visibility)
-        avg_brightness = {k: v/len(sample_times) for k, v in regions_brightness.items()}
-        
         # Sort by how close to medium brightness (128)
-        optimal_region = min(avg_brightness.items(), 
+        optimal_region = min(avg_brightness.items(),
                            key=lambda x: abs(x[1] - 128))
-        
+
         print(f"Optimal text placement: {optimal_region[0]} (brightness: {optimal_region[1]:.1f})")
-        
+
         position_map = {
             'top': ('center', 0.2),      # 20% from top
             'center': ('center', 0.5),   # Center
             'bottom': ('center', 0.8)    # 20% from bottom
         }
-        
+
         return position_map[optimal_region[0]]
-        
+
     except Exception as e:
         print(f"Text placement analysis failed: {e}")
         return ('center', 0.8)  # Default to bottom center
 
-# Create enhanced text with intelligent positioning
-optimal_position = analyze_video_for_text_placement(background_clip)
-# Force center positioning for now to ensure it works
-optimal_position = ('center', 0.5)  # Always center
-print(f"Text will be positioned at: center")
-text_clips = create_enhanced_video_text(proverb, max_width=35, video_size=background_clip.size)
-
-# Apply center positioning to all text clips with proper duration
-positioned_text_clips = []
-for clip in text_clips:
-    # Force center positioning
-    positioned_clip = clip.with_position('center').with_duration(final_duration)
-    positioned_text_clips.append(positioned_clip)
-
-# Create text with enhanced background
-text_with_bg = create_dynamic_text_background(positioned_text_clips, bg_style='gradient')
-
-# Ensure all text clips have center positioning for the final composition
-final_text_clips = []
-for clip in text_with_bg:
-    final_clip = clip.with_position('center').with_duration(final_duration)
-    final_text_clips.append(final_clip)
+def position_text_block(text_clips, video_size, position):
+    """Stack the lines as one horizontally centered block around ``position``
+
+    ``position`` is a ('center', fraction) pair as returned by
+    analyze_video_for_text_placement; the block is centered on that fraction
+    of the video height and kept inside the frame.
+    """
+    block_height = sum(clip.size[1] for clip in text_clips)
+    y = int(video_size[1] * position[1] - block_height / 2)
+    y = max(0, min(y, video_size[1] - block_height))
+
+    positioned_clips = []
+    for clip in text_clips:
+        positioned_clips.append(clip.with_position(('center', y)))
+        y += clip.size[1]
+    return positioned_clips
 
 # Enhanced audio processing
-def process_audio_for_video(music_path, video_duration, video_audio=None):
+def process_audio_for_video(music_path, video_duration, video_audio=None, assets=None):
     """Process audio with advanced mixing and enhancement"""
-    
+
     # Load background music
-    background_music = AudioFileClip(music_path).subclipped(0, video_duration)
-    
+    if assets:
+        background_music = assets.music(music_path, 0, video_duration)
+    else:
+        background_music = music_clip(load_music(music_path), 0, video_duration)
+
     # Simple volume normalization
     def normalize_volume(audio_clip, target_volume=0.7):
         """Normalize audio to target volume level"""
         return audio_clip.with_volume_scaled(target_volume)
-    
+
     background_music = normalize_volume(background_music, target_volume=0.8)
-    
+
     if video_audio and video_audio.duration > 0:
         # Mix original video audio with background music
         try:
             original_audio = video_audio.subclipped(0, video_duration)
             original_audio = normalize_volume(original_audio, target_volume=0.3)
-            
+
             # Create composite audio
             final_audio = CompositeAudioClip([original_audio, background_music])
             print("Mixed original video audio with background music")
@@ -208,74 +198,212 @@ def process_audio_for_video(music_path, video_duration, video_audio=None):
         print("Using background music only")
         return background_music
 
-# Process audio
-final_audio = process_audio_for_video(music_path, final_duration, background_clip.audio)
+def pick_export_settings(video_width):
+    """Quality settings based on video resolution"""
+    if video_width >= 1080:
+        # High quality settings for HD content
+        return {
+            'fps': 30,
+            'codec': 'libx264',
+            'audio_codec': 'aac',
+            'bitrate': '3000k',
+            'preset': 'medium'  # Balance between quality and encoding speed
+        }
+    elif video_width >= 720:
+        # Medium quality settings
+        return {
+            'fps': 30,
+            'codec': 'libx264',
+            'audio_codec': 'aac',
+            'bitrate': '2000k'
+        }
+    else:
+        # Standard quality settings
+        return {
+            'fps': 24,
+            'codec': 'libx264',
+            'audio_codec': 'aac',
+            'bitrate': '1500k'
+        }
 
-# Create the final composite video with centered text
-video = CompositeVideoClip([background_clip] + final_text_clips)
-video = video.with_audio(final_audio)
 
-# Enhanced export settings for high quality
-output_path = "motivational_video_with_video_bg_enhanced.mp4"
+def create_text_overlay(proverb, duration, video_size, position):
+    """The proverb as text lines with their boxes, stacked around ``position``.
+
+    The lines and boxes are static, so they are flattened once into a
+    StaticOverlay to blend onto each background frame. Returns the overlay
+    and the positioned text clips.
+    """
+    text_clips = create_enhanced_video_text(proverb, duration, max_width=35, video_size=video_size)
+
+    # Create text with enhanced background
+    text_with_bg = create_dynamic_text_background(text_clips, bg_style='gradient')
+
+    # Stack the lines around the chosen position for the final composition
+    final_text_clips = position_text_block(text_with_bg, video_size, position)
+    return flatten_overlay(final_text_clips, video_size), final_text_clips
+
+
+def compose_reel(background_video_path, music_path, proverb, assets, max_duration=None,
+                 budget=None, pixel_format='rgb24', start=0):
+    """Build the final composition (background, text and audio) without rendering it.
+
+    Returns the video clip and the positioned text lines. ``budget`` (a
+    CpuBudget) limits the decoder and prefetch threads. With
+    ``pixel_format='yuv420p'`` the frames are I420 arrays for the yuv420p
+    render path (see ``write_pipelined_videofile``). The background is
+    used from ``start`` seconds on, for at most ``max_duration`` seconds
+    (default: the module's ``max_duration``).
+    """
+    if max_duration is None:
+        max_duration = globals()['max_duration']  # The module setting, read at call time
+    # Load the background video with enhanced settings. Smart resizing: ffmpeg
+    # scales it down to 1080 wide while decoding, keeping the aspect ratio, and
+    # leaves smaller videos at their original size. A thread decodes the next
+    # frames while the current one is composited
+    background_clip = assets.video(background_video_path, width=1080, upscale=False,
+                                   pixel_format=pixel_format, keyframe_seek=start > 0,
+                                   **reader_options(budget, PREFETCH_FRAMES))
+
+    # Enhanced duration handling - use more of the video if it's good quality
+    start = min(start, max(0, background_clip.duration - 1))
+    final_duration = min(max_duration, background_clip.duration - start)  # Up to 15 seconds instead of 10
+    background_clip = background_clip.subclipped(start, start + final_duration)
+
+    # Create enhanced text with intelligent positioning
+    optimal_position = analyze_video_for_text_placement(background_video_path, start, final_duration)
+    print(f"Text will be positioned at: {optimal_position[1]:.0%} of the height")
+    overlay, final_text_clips = create_text_overlay(proverb, final_duration, background_clip.size,
+                                                    optimal_position)
+
+    # Process audio
+    final_audio = process_audio_for_video(music_path, final_duration, background_clip.audio,
+                                          assets=assets)
+
+    # Create the final video with the text blended onto each background frame
+    if pixel_format == 'yuv420p':
+        overlay = overlay.to_yuv420p(background_clip.size)
+    video = overlay.apply_to(background_clip, in_place=True)
+    video = video.with_audio(final_audio)
+    return video, final_text_clips
+
+
+def render_reel(background_video_path, music_path, proverb, output_path=output_path, assets=None,
+                logger="bar", tune=None, budget=None, renditions=None, yuv=None, start=None):
+    """Render one reel. Pass a shared AssetCache to reuse loaded files across reels.
+
+    With ``tune`` the encoder settings come from ``tune_encoder`` (cached per
+    content class) rather than from the video width. A CpuBudget passed as
+    ``budget`` limits the threads the render starts.
+
+    With ``renditions`` (preset names or settings, see renditions.py) the
+    reel is composited once and encoded into one file per rendition, named
+    after ``output_path``; the list of files is returned. They get no
+    lower quality fallback: a failed encode raises. ``yuv`` selects
+    the yuv420p render path. ``start`` is where the reel starts in the
+    background: seconds, 'random' or 'analysis' (see background_window.py).
+    ``tune``, ``yuv`` and ``start`` default to the module settings
+    ``tune_export``, ``yuv_pipeline`` and ``background_start``, read at call
+    time.
+    """
+    tune = tune_export if tune is None else tune
+    yuv = yuv_pipeline if yuv is None else yuv
+    start = background_start if start is None else start
+    own_assets = assets is None
+    if own_assets:
+        assets = AssetCache(videos_folder=videos_folder, music_folder=music_folder,
+                            proverbs_file=proverbs_file)
+
+    print(f"Using background video: {background_video_path}")
+    print(f"Using music: {music_path}")
+    print(f"Using proverb: {proverb}")
+
+    if isinstance(start, str):
+        start = pick_start(assets.index, background_video_path, max_duration, mode=start)
+    if start:
+        print(f"Background starts at {start:.2f}s")
+
+    pixel_format = 'yuv420p' if yuv else 'rgb24'
+    video, final_text_clips = compose_reel(background_video_path, music_path, proverb, assets,
+                                           budget=budget, pixel_format=pixel_format, start=start)
+    final_duration = video.duration
+
+    # Enhanced export settings for high quality
+    export_settings = pick_export_settings(video.size[0])
+
+    print(f"Exporting with settings: {export_settings}")
+
+    # The composed frames are spooled to a lossless file first, so the
+    # fallback encode below starts from them instead of compositing every
+    # frame again. The spool takes hundreds of MB, it is deleted at the end
+    spool_dir = tempfile.mkdtemp(prefix="reel_spool_")
+    spool_path = os.path.join(spool_dir, "frames.mkv")
+
+    try:
+        spool_lossless(video, spool_path, export_settings['fps'], logger=logger, budget=budget,
+                       pixel_format=pixel_format)
+        if tune:
+            tuned = tune_encoder(spool_path, video.size, export_settings['fps'], final_duration,
+                                 budget=budget)
+            export_settings = dict(export_settings, bitrate=None, **tuned)
+            print(f"Exporting with tuned settings: {export_settings}")
+        if renditions:
+            # Every platform version is encoded from the same rendered frames
+            targets = resolve_renditions(renditions, output_path)
+            if tune:
+                targets = [dict(target, bitrate=None, **tuned) for target in targets]
+            output_path = encode_renditions(spool_path, video.size, export_settings['fps'],
+                                            targets, logger=logger, budget=budget)
+        else:
+            encode_intermediate(spool_path, output_path, video.size, logger=logger, budget=budget,
+                                **export_settings)
+        print(f"Enhanced video with video background saved as {output_path}")
+
+        # Display final video info
+        print(f"\n📊 Final Video Stats:")
+        print(f"   Duration: {final_duration:.1f} seconds")
+        print(f"   Resolution: {video.size[0]}x{video.size[1]}")
+        print(f"   Text lines: {len(final_text_clips)}")
+        print(f"   Audio: {'Mixed' if isinstance(video.audio, CompositeAudioClip) else 'Background music only'}")
+
+    except Exception as e:
+        print(f"Export failed: {e}")
+        if renditions:
+            # A single fallback file is not what the caller asked for
+            raise
+        # Try with lower quality settings as fallback
+        fallback_settings = {
+            'fps': 24,
+            'codec': 'libx264',
+            'audio_codec': 'aac',
+            'bitrate': '1000k'
+        }
+        print("Trying with fallback settings...")
+        if os.path.exists(spool_path):
+            # Every frame is already rendered, only the encode is redone
+            encode_intermediate(spool_path, output_path, video.size, logger=logger,
+                                budget=budget, **fallback_settings)
+        else:
+            write_pipelined_videofile(video, output_path, logger=logger, budget=budget,
+                                      input_pixel_format=pixel_format, **fallback_settings)
+        print(f"Video saved with fallback settings as {output_path}")
+
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        # Clean up resources (the background video and music readers are owned
+        # by the asset cache, so only a locally created cache is closed here)
+        if own_assets:
+            assets.close()
+        print("Resources cleaned up successfully")
+
+    return output_path
+
+
+if __name__ == "__main__":
+    assets = AssetCache(videos_folder=videos_folder, music_folder=music_folder,
+                        proverbs_file=proverbs_file)
+    background_video_path, music_path, proverb = pick_inputs(assets)
 
-# Quality settings based on video resolution
-video_width = background_clip.size[0]
-if video_width >= 1080:
-    # High quality settings for HD content
-    export_settings = {
-        'fps': 30,
-        'codec': 'libx264',
-        'audio_codec': 'aac',
-        'bitrate': '3000k',
-        'preset': 'medium'  # Balance between quality and encoding speed
-    }
-elif video_width >= 720:
-    # Medium quality settings
-    export_settings = {
-        'fps': 30,
-        'codec': 'libx264',
-        'audio_codec': 'aac',
-        'bitrate': '2000k'
-    }
-else:
-    # Standard quality settings
-    export_settings = {
-        'fps': 24,
-        'codec': 'libx264',
-        'audio_codec': 'aac',
-        'bitrate': '1500k'
-    }
-
-print(f"Exporting with settings: {export_settings}")
-
-try:
-    video.write_videofile(output_path, **export_settings)
-    print(f"Enhanced video with video background saved as {output_path}")
-    
-    # Display final video info
-    print(f"\n📊 Final Video Stats:")
-    print(f"   Duration: {final_duration:.1f} seconds")
-    print(f"   Resolution: {background_clip.size[0]}x{background_clip.size[1]}")
-    print(f"   Text lines: {len(final_text_clips)}")
-    print(f"   Audio: {'Mixed' if background_clip.audio else 'Background music only'}")
-    
-except Exception as e:
-    print(f"Export failed: {e}")
-    # Try with lower quality settings as fallback
-    fallback_settings = {
-        'fps': 24,
-        'codec': 'libx264',
-        'audio_codec': 'aac',
-        'bitrate': '1000k'
-    }
-    print("Trying with fallback settings...")
-    video.write_videofile(output_path, **fallback_settings)
-    print(f"Video saved with fallback settings as {output_path}")
-
-finally:
-    # Clean up resources
-    background_clip.close()
-    if final_audio:
-        final_audio.close()
-    video.close()
-    print("Resources cleaned up successfully")
+    render_reel(background_video_path, music_path, proverb, output_path, assets=assets,
+                renditions=output_renditions)
+    assets.close()
@@ -0,0 +1,53 @@
+import json
+import os
+
+
+def evict_lru(cache_dir, max_bytes, suffix=""):
+    """Delete the least recently used files of ``cache_dir`` until they fit in ``max_bytes``.
+
+    Only files ending with ``suffix`` count; files still being written
+    (``.tmp``) are left alone. Recently used means recently modified:
+    caches mark a hit with ``os.utime``.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".tmp") or not name.endswith(suffix):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            continue  # Removed by another process
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass  # Removed by another process
+        total -= size
+
+
+def load_json(cache_file):
+    """The dict stored in the JSON ``cache_file``, empty if it is missing or unreadable."""
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def store_json_entry(cache_file, key, value, indent=None):
+    """Set ``key`` in the JSON ``cache_file``, replacing the file atomically.
+
+    The file is re-read first so entries added by other processes are kept.
+    """
+    cache = load_json(cache_file)
+    cache[key] = value
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=indent)
+    os.replace(tmp_path, cache_file)
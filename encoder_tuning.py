@@ -0,0 +1,126 @@
+import math
+import os
+import re
+import subprocess as sp
+import tempfile
+import time
+
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import cross_platform_popen_params, ffmpeg_escape_filename, subprocess_call
+
+from disk_cache import load_json, store_json_entry
+
+CACHE_FILE = os.path.join(".cache", "encoder_tuning.json")
+
+# Fastest first. For each preset the highest CRF that meets the target wins
+PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium')
+CRF_VALUES = (30, 27, 24, 21, 18)
+
+# Default quality targets of the two metrics
+TARGETS = {'ssim': 0.97, 'psnr': 38.0}
+
+SAMPLE_SECONDS = 2
+
+
+def content_class(lossless_path, size, fps, duration):
+    """Coarse class of the content: output format plus a complexity bucket.
+
+    The complexity is the bits per pixel of the lossless render, which grows
+    with detail and motion, bucketed on a log2 scale.
+    """
+    w, h = size
+    bits_per_pixel = os.path.getsize(lossless_path) * 8 / (w * h * fps * duration)
+    return f"{w}x{h}@{fps}/c{round(math.log2(max(bits_per_pixel, 1e-3)))}"
+
+
+def measure_quality(encoded_path, reference_path, start, duration, metric='ssim'):
+    """SSIM (0-1) or PSNR (dB) of ``encoded_path`` against the same window of the reference."""
+    cmd = [
+        FFMPEG_BINARY, "-hide_banner",
+        "-i", ffmpeg_escape_filename(encoded_path),
+        "-ss", "%.06f" % start, "-t", "%.06f" % duration,
+        "-i", ffmpeg_escape_filename(reference_path),
+        "-lavfi", f"[0:v]format=yuv420p[a];[1:v]format=yuv420p[b];[a][b]{metric}",
+        "-f", "null", "-",
+    ]
+    popen_params = cross_platform_popen_params(
+        {"stdout": sp.DEVNULL, "stderr": sp.PIPE, "stdin": sp.DEVNULL}
+    )
+    proc = sp.Popen(cmd, **popen_params)
+    _, err = proc.communicate()
+    pattern = r"All:\s*([\d.]+)" if metric == 'ssim' else r"average:\s*([\d.]+|inf)"
+    match = re.search(pattern, err.decode("utf8", "replace"))
+    if proc.returncode or match is None:
+        raise IOError(f"Could not measure {metric} of {encoded_path}")
+    return float(match.group(1))
+
+
+def trial_encode(reference_path, output_path, size, start, duration, preset, crf, budget=None):
+    """Encode a window of the reference like the delivery encode and return the time it took.
+
+    A CpuBudget passed as ``budget`` sizes the decoder and encoder threads,
+    like for the delivery encode.
+    """
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error"]
+    if budget is not None:
+        cmd += budget.decoder_params()
+    cmd += [
+        "-ss", "%.06f" % start, "-t", "%.06f" % duration,
+        "-i", ffmpeg_escape_filename(reference_path),
+        "-an", "-vcodec", "libx264", "-preset", preset, "-crf", str(crf),
+    ]
+    if size[0] % 2 == 0 and size[1] % 2 == 0:
+        cmd += ["-pix_fmt", "yuv420p"]
+    if budget is not None:
+        cmd += budget.encoder_params('libx264')
+    started = time.perf_counter()
+    subprocess_call(cmd + [ffmpeg_escape_filename(output_path)], logger=None)
+    return time.perf_counter() - started
+
+
+def tune_encoder(lossless_path, size, fps, duration, metric='ssim', target=None,
+                 cache_file=CACHE_FILE, budget=None):
+    """Pick the fastest x264 preset and CRF whose output meets the quality target.
+
+    A ``SAMPLE_SECONDS`` window from the middle of the lossless render is
+    trial-encoded for every preset (fastest first) at decreasing CRF until
+    the ``metric`` reaches ``target``; the candidate with the shortest encode
+    time wins. Results are cached per content class (see content_class), so
+    later reels of the same kind skip the trials. The trials run within
+    ``budget`` (a CpuBudget), if given.
+
+    Returns ``{'preset': ..., 'crf': ...}``.
+    """
+    target = TARGETS[metric] if target is None else target
+    key = f"{metric}>={target}:{content_class(lossless_path, size, fps, duration)}"
+    cache = load_json(cache_file)
+    if key in cache:
+        return cache[key]
+
+    sample = min(SAMPLE_SECONDS, duration)
+    start = max(0.0, (duration - sample) / 2)
+    best = None
+    handle, trial_path = tempfile.mkstemp(suffix=".mp4")
+    os.close(handle)
+    try:
+        for preset in PRESETS:
+            for crf in CRF_VALUES:
+                seconds = trial_encode(lossless_path, trial_path, size, start, sample,
+                                       preset, crf, budget=budget)
+                if measure_quality(trial_path, lossless_path, start, sample, metric) >= target:
+                    if best is None or seconds < best[0]:
+                        best = (seconds, preset, crf)
+                    break
+                if best is not None and seconds > best[0]:
+                    break  # Lower CRFs of this preset are slower still
+    finally:
+        os.remove(trial_path)
+
+    # Nothing met the target: use the best quality candidate
+    _, preset, crf = best or (None, PRESETS[-1], CRF_VALUES[-1])
+    settings = {'preset': preset, 'crf': crf}
+    print(f"🎛️ Encoder tuned for {key}: preset={preset}, crf={crf}")
+
+    store_json_entry(cache_file, key, settings, indent=1)
+
+    return settings
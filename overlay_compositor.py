@@ -0,0 +1,298 @@
+import numpy as np
+from moviepy import ImageClip
+from moviepy.tools import compute_position
+
+# Output frames handed out per animated clip before a buffer is reused. The
+# writer consumes each frame before asking for the next one, two leave margin
+RING_SIZE = 2
+
+# (Kr, Kb) of the Y'CbCr matrices, for overlays blended onto yuv420p frames
+YUV_MATRICES = {'bt601': (0.299, 0.114), 'bt709': (0.2126, 0.0722)}
+
+
+class OverlayRegion:
+    """One rectangle of a flattened overlay, blended with integer arithmetic.
+
+    ``color`` is the premultiplied colour (0-255) and ``alpha`` the coverage
+    (0-1) of the overlay inside ``box`` (x0, y0, x1, y1 in frame coordinates).
+    Blending uses 16 bit fixed point math in preallocated buffers:
+    ``out = (frame * (255 - a) + color * 255) / 255`` with exact rounding,
+    computed in place over the box only.
+    """
+
+    def __init__(self, color, alpha, box):
+        self.color = color
+        self.alpha = alpha
+        self.box = box
+
+        # Fixed point form of the layer: 8 bit inverse alpha and the
+        # premultiplied colour scaled by 255, plus the rounding term
+        alpha8 = np.round(alpha * 255).astype(np.uint16)
+        self._inv_alpha = 255 - alpha8
+        self._color = np.round(color * 255).astype(np.uint16) + 128
+        self._acc = np.empty(color.shape, dtype=np.uint16)
+        self._tmp = np.empty(color.shape, dtype=np.uint16)
+
+    def blend_into(self, frame):
+        """Blend the region onto the writable ``frame`` in place."""
+        x0, y0, x1, y1 = self.box
+        region = frame[y0:y1, x0:x1]
+        acc, tmp = self._acc, self._tmp
+        np.multiply(region, self._inv_alpha, out=acc)
+        acc += self._color
+        # x / 255 rounded, for x <= 65535 - 255: (x + (x >> 8)) >> 8
+        np.right_shift(acc, 8, out=tmp)
+        acc += tmp
+        np.right_shift(acc, 8, out=tmp)
+        np.copyto(region, tmp, casting='unsafe')
+
+
+class StaticOverlay:
+    """A stack of non-moving overlay clips flattened into RGBA regions.
+
+    Each region is a dirty rectangle: the bounding box of one group of
+    overlapping overlay clips (a text line and its box, say). Blending only
+    touches the pixels inside those rectangles, so a few lines of text on a
+    1080x1920 frame read and write a small fraction of the frame, instead
+    of one PIL composite per layer over the whole frame.
+    """
+
+    def __init__(self, regions):
+        self.regions = regions
+
+    def blend(self, frame, out=None):
+        """Return ``frame`` with the overlay blended on top of it.
+
+        The result goes to ``out`` (which may be ``frame`` itself if it is
+        writable) or to a new array.
+        """
+        if frame.shape[2] > 3:
+            frame = frame[:, :, :3]
+        if out is None:
+            # Frames coming from moviepy's ffmpeg reader are read-only views of the pipe buffer
+            out = np.array(frame, dtype=np.uint8)
+        elif out is not frame:
+            np.copyto(out, frame)
+
+        for region in self.regions:
+            region.blend_into(out)
+        return out
+
+    def frame_shape(self, size):
+        """Shape of the frames of ``size`` this overlay blends onto."""
+        w, h = size
+        return (h, w, 3)
+
+    def can_blend_in_place(self, frame):
+        return frame.flags.writeable and frame.shape[2] == 3
+
+    def to_yuv420p(self, size, matrix='bt709'):
+        """The same overlay for yuv420p (I420) frames of ``size``, in studio range ``matrix``.
+
+        Each region is grown to even coordinates and split into a full
+        resolution luma region and two chroma regions, whose premultiplied
+        colour and alpha are averaged over 2x2 pixels like the chroma of
+        the frame itself.
+        """
+        kr, kb = YUV_MATRICES[matrix]
+        luma = np.array([kr, 1 - kr - kb, kb])
+        # Rows give Y, U and V of 0-255 RGB, without the 16/128 offsets
+        rgb_to_yuv = np.stack([luma * 219 / 255,
+                               (np.array([0, 0, 1]) - luma) / (2 * (1 - kb)) * 224 / 255,
+                               (np.array([1, 0, 0]) - luma) / (2 * (1 - kr)) * 224 / 255])
+        rgb_to_yuv = rgb_to_yuv.T.astype(np.float32)
+        offsets = np.array([16, 128, 128], dtype=np.float32)
+
+        planes = []
+        for region in self.regions:
+            x0, y0, x1, y1 = region.box
+            ex0, ey0, ex1, ey1 = x0 - x0 % 2, y0 - y0 % 2, x1 + x1 % 2, y1 + y1 % 2
+            color = np.zeros((ey1 - ey0, ex1 - ex0, 3), dtype=np.float32)
+            alpha = np.zeros((ey1 - ey0, ex1 - ex0, 1), dtype=np.float32)
+            color[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0] = region.color
+            alpha[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0] = region.alpha
+
+            # Premultiplied: a * (offset + M c / a) = a * offset + M c
+            yuv = color @ rgb_to_yuv + alpha * offsets
+            planes.append((0, OverlayRegion(yuv[:, :, 0].copy(), alpha[:, :, 0].copy(),
+                                            (ex0, ey0, ex1, ey1))))
+
+            ch, cw = (ey1 - ey0) // 2, (ex1 - ex0) // 2
+            chroma = yuv[:, :, 1:].reshape(ch, 2, cw, 2, 2).mean(axis=(1, 3))
+            chroma_alpha = alpha[:, :, 0].reshape(ch, 2, cw, 2).mean(axis=(1, 3))
+            box = (ex0 // 2, ey0 // 2, ex1 // 2, ey1 // 2)
+            planes.append((1, OverlayRegion(chroma[:, :, 0].copy(), chroma_alpha, box)))
+            planes.append((2, OverlayRegion(chroma[:, :, 1].copy(), chroma_alpha, box)))
+        return PlanarOverlay(planes, size)
+
+    def apply_to(self, background_clip, in_place=False):
+        """Return ``background_clip`` with the overlay burnt into every frame.
+
+        For an ImageClip background moviepy applies the transform only once,
+        so the result is still a single static image. Other clips are blended
+        into a small ring of reused frame buffers, so rendering allocates no
+        new frames.
+
+        With ``in_place=True`` writable background frames are blended
+        directly, without copying the rest of the frame. Only use it when the
+        frames are scratch buffers nobody else reads, like the ones of
+        ScaledVideoReader.
+        """
+        if isinstance(background_clip, ImageClip):
+            return background_clip.image_transform(self.blend)
+
+        ring = [np.empty(self.frame_shape(background_clip.size), dtype=np.uint8)
+                for _ in range(RING_SIZE)]
+        state = {'position': 0, 'input': None, 'output': None}
+
+        def blend_frame(frame):
+            if frame is state['input']:
+                # The reader handed out the same frame again (e.g. output fps
+                # above the source fps): it is blended already
+                return state['output']
+            if in_place and self.can_blend_in_place(frame):
+                out = self.blend(frame, out=frame)
+            else:
+                out = self.blend(frame, out=ring[state['position']])
+                state['position'] = (state['position'] + 1) % RING_SIZE
+            state['input'], state['output'] = frame, out
+            return out
+
+        clip = background_clip.image_transform(blend_frame)
+        # Lets the render pipeline decode and blend in separate stages. It
+        # shares ``state``: moviepy already blended frame 0 above to get the
+        # clip size, possibly in place in the reader's buffer
+        clip.overlay_source = (background_clip, self, in_place, clip.frame_function, state)
+        return clip
+
+
+class PlanarOverlay(StaticOverlay):
+    """A StaticOverlay blending onto yuv420p frames (see ``StaticOverlay.to_yuv420p``).
+
+    Frames are I420 arrays of shape (height * 3 // 2, width), like the ones
+    ScaledVideoReader decodes with ``pixel_format='yuv420p'``. ``planes``
+    lists (plane index, OverlayRegion) pairs, 0 being Y, 1 U and 2 V.
+    """
+
+    def __init__(self, planes, size):
+        StaticOverlay.__init__(self, [region for _, region in planes])
+        self.planes = planes
+        self.size = size
+
+    def frame_shape(self, size):
+        w, h = size
+        return (h * 3 // 2, w)
+
+    def can_blend_in_place(self, frame):
+        return frame.flags.writeable
+
+    def blend(self, frame, out=None):
+        if out is None:
+            out = np.array(frame, dtype=np.uint8)
+        elif out is not frame:
+            np.copyto(out, frame)
+
+        planes = yuv420p_planes(out, self.size)
+        for plane, region in self.planes:
+            region.blend_into(planes[plane])
+        return out
+
+
+def yuv420p_planes(frame, size):
+    """Views of the Y, U and V planes of the contiguous I420 ``frame`` of ``size``."""
+    w, h = size
+    flat = frame.reshape(-1)
+    luma, chroma = w * h, (w // 2) * (h // 2)
+    return (flat[:luma].reshape(h, w),
+            flat[luma:luma + chroma].reshape(h // 2, w // 2),
+            flat[luma + chroma:].reshape(h // 2, w // 2))
+
+
+def overlay_layers(clip):
+    """``(background_clip, overlay, in_place, state)`` of a clip made by ``StaticOverlay.apply_to``.
+
+    ``state`` holds the last background frame blended (``'input'``) and
+    the result (``'output'``); whoever blends frames of the clip outside of
+    its frame function keeps it up to date.
+
+    None for other clips, including ones transformed further after
+    ``apply_to`` (subclipped, resized...), whose frames are no longer just
+    the blended background frames.
+    """
+    source = getattr(clip, 'overlay_source', None)
+    if source is None or clip.frame_function is not source[3]:
+        return None
+    return source[:3] + source[4:]
+
+
+def _merge_boxes(boxes):
+    """Merge overlapping boxes until no two of them overlap."""
+    boxes = list(boxes)
+    i = 0
+    while i < len(boxes):
+        for j in range(i + 1, len(boxes)):
+            a, b = boxes[i], boxes[j]
+            if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                boxes[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                del boxes[j]
+                break
+        else:
+            i += 1
+            continue
+        i = 0  # A grown box may now overlap earlier ones
+    return boxes
+
+
+def flatten_overlay(clips, size, t=0):
+    """Composite static overlay clips once into a StaticOverlay of ``size``.
+
+    The clips are stacked like CompositeVideoClip would (by layer index, then
+    list order) using their frame, mask and position at time ``t``. They must
+    not move or change over time and must cover the whole background clip.
+    """
+    w, h = size
+    color = np.zeros((h, w, 3), dtype=np.float32)
+    alpha = np.zeros((h, w, 1), dtype=np.float32)
+    boxes = []
+
+    for clip in sorted(clips, key=lambda clip: clip.layer_index):
+        ct = t - clip.start
+        frame = clip.get_frame(ct)[:, :, :3].astype(np.float32)
+        clip_h, clip_w = frame.shape[:2]
+
+        mask = np.ones((clip_h, clip_w), dtype=np.float32)
+        if clip.mask is not None:
+            # Like moviepy, use the top left corner of a mask of another size
+            clip_mask = clip.mask.get_frame(ct)
+            mh, mw = min(clip_mask.shape[0], clip_h), min(clip_mask.shape[1], clip_w)
+            mask[:] = 0
+            mask[:mh, :mw] = clip_mask[:mh, :mw]
+
+        x, y = compute_position((clip_w, clip_h), size, clip.pos(ct), clip.relative_pos)
+
+        # Intersect the clip rectangle with the frame
+        fx0, fy0 = max(x, 0), max(y, 0)
+        fx1, fy1 = min(x + clip_w, w), min(y + clip_h, h)
+        if fx0 >= fx1 or fy0 >= fy1:
+            continue
+        boxes.append((fx0, fy0, fx1, fy1))
+
+        src = (slice(fy0 - y, fy1 - y), slice(fx0 - x, fx1 - x))
+        dst = (slice(fy0, fy1), slice(fx0, fx1))
+        a = mask[src][:, :, None]
+
+        # Premultiplied "over" operator
+        color[dst] = frame[src] * a + color[dst] * (1 - a)
+        alpha[dst] = a + alpha[dst] * (1 - a)
+
+    regions = []
+    for bx0, by0, bx1, by1 in _merge_boxes(boxes):
+        # Shrink each dirty rectangle to its visible pixels
+        ys, xs = np.nonzero(alpha[by0:by1, bx0:bx1, 0])
+        if len(ys) == 0:
+            continue
+        x0, y0 = bx0 + int(xs.min()), by0 + int(ys.min())
+        x1, y1 = bx0 + int(xs.max()) + 1, by0 + int(ys.max()) + 1
+        regions.append(OverlayRegion(color[y0:y1, x0:x1].copy(), alpha[y0:y1, x0:x1].copy(),
+                                     (x0, y0, x1, y1)))
+    return StaticOverlay(regions)
@@ -0,0 +1,148 @@
+import argparse
+import hashlib
+import json
+import os
+
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import ffmpeg_escape_filename, subprocess_call
+
+from asset_index import AssetIndex
+from background_reader import output_size
+
+PROXY_DIR = os.path.join(".cache", "proxies")
+PROXY_VERSION = 2
+
+# Proxies are encoded near-transparently, with a keyframe every second so
+# that seeking into them never decodes more than a second of video
+PROXY_CRF = 16
+GOP_SECONDS = 1
+
+# Proxies matching what the video-background scripts decode. fps None keeps
+# the source frame rate (as constant frame rate)
+PROXY_PRESETS = {
+    'video_bg': {'width': 640, 'height': None, 'upscale': True, 'fps': 24},
+    'video_bg_enhanced': {'width': 1080, 'height': None, 'upscale': False, 'fps': None},
+}
+
+
+def proxy_settings(width=None, height=None, upscale=True, fps=None):
+    if fps is not None and float(fps).is_integer():
+        fps = int(fps)  # 24.0 from the command line is the same proxy as 24
+    return {'width': width, 'height': height, 'upscale': upscale, 'fps': fps}
+
+
+def source_signature(source_path, entry):
+    """The version of ``source_path`` its asset index ``entry`` describes: path, size and mtime.
+
+    Cheap to compute, unlike a content digest of the whole video.
+    """
+    return [os.path.abspath(source_path), entry['size'], entry['mtime_ns']]
+
+
+def proxy_path(source_path, entry, settings, proxy_dir=PROXY_DIR):
+    """Where the proxy of ``source_path`` (asset index ``entry``) made with ``settings`` is kept."""
+    key_data = {'source': source_signature(source_path, entry), 'settings': settings,
+                'version': PROXY_VERSION}
+    key = hashlib.sha1(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+    return os.path.join(proxy_dir, key + ".mp4")
+
+
+def find_proxy(source_path, entry, settings, proxy_dir=PROXY_DIR):
+    """The existing proxy of ``source_path`` for ``settings``, or None.
+
+    None as well when the file changed since ``entry`` was indexed.
+    """
+    if entry is None or not os.path.isdir(proxy_dir):
+        return None
+    stat = os.stat(source_path)
+    if entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+        return None
+    path = proxy_path(source_path, entry, settings, proxy_dir)
+    return path if os.path.exists(path) else None
+
+
+def make_proxy(source_path, entry, settings, proxy_dir=PROXY_DIR, logger=None):
+    """Transcode ``source_path`` (asset index ``entry``) into its render-ready proxy.
+
+    The proxy is scaled like ScaledVideoReader would scale the source (to
+    even dimensions), at a constant frame rate, yuv420p, with a short fixed
+    GOP. It only appears under its final name once complete.
+
+    Returns None, making no proxy, when neither ``settings`` nor the index
+    give a frame rate: the original file is then read instead.
+    """
+    path = proxy_path(source_path, entry, settings, proxy_dir)
+    if os.path.exists(path):
+        return path
+    fps = settings['fps'] or entry.get('fps')
+    if not fps:
+        return None
+
+    w, h = output_size((entry['width'], entry['height']), width=settings['width'],
+                       height=settings['height'], upscale=settings['upscale'])
+    w, h = w - w % 2, h - h % 2
+    gop = max(1, round(GOP_SECONDS * fps))
+
+    os.makedirs(proxy_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.mp4"
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-i", ffmpeg_escape_filename(source_path),
+        "-vf", "scale=%d:%d:flags=bicubic,fps=%s" % (w, h, fps),
+        "-vcodec", "libx264", "-preset", "veryfast", "-crf", str(PROXY_CRF),
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-pix_fmt", "yuv420p",
+        "-acodec", "aac", "-b:a", "192k",
+        "-movflags", "+faststart", ffmpeg_escape_filename(tmp_path),
+    ]
+    try:
+        subprocess_call(cmd, logger=logger)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def ingest(index, settings_list, proxy_dir=PROXY_DIR):
+    """Make every missing proxy of every usable video in ``index``. Returns the number made."""
+    made = 0
+    for source_path in index.files('video'):
+        entry = index.get(source_path)
+        for settings in settings_list:
+            if os.path.exists(proxy_path(source_path, entry, settings, proxy_dir)):
+                continue
+            print(f"   🎞️ {source_path} -> {settings}")
+            if make_proxy(source_path, entry, settings, proxy_dir) is None:
+                print("      ⚠️ Unknown frame rate, the original file will be used")
+                continue
+            made += 1
+    return made
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Transcode the background videos once into render-ready proxies.")
+    parser.add_argument('--width', type=int, help="proxy width (default: the script presets)")
+    parser.add_argument('--height', type=int, help="proxy height")
+    parser.add_argument('--fps', type=float, help="proxy frame rate (default: the source's)")
+    parser.add_argument('--no-upscale', action='store_true',
+                        help="leave videos smaller than the target size at their size")
+    parser.add_argument('--videos', default="videos", help="video folder (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.width or args.height:
+        settings_list = [proxy_settings(args.width, args.height, not args.no_upscale, args.fps)]
+    else:
+        settings_list = list(PROXY_PRESETS.values())
+
+    index = AssetIndex(folders={'video': args.videos})
+    index.refresh()
+    print(f"🎬 Making proxies of {len(index.files('video'))} video(s) in {PROXY_DIR}")
+    made = ingest(index, settings_list)
+    print(f"✅ {made} proxy file(s) made")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
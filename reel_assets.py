@@ -0,0 +1,159 @@
+from collections import OrderedDict
+
+from moviepy import ImageClip
+from asset_index import AssetIndex
+from audio_cache import load_music, music_clip
+from background_reader import BackgroundVideoClip
+from proxy_cache import PROXY_DIR, find_proxy, proxy_settings
+
+# Paths
+images_folder = "images"
+videos_folder = "videos"
+music_folder = "music"
+proverbs_file = "proverbs.txt"
+
+# Background videos kept open at once; each holds an ffmpeg process
+MAX_OPEN_VIDEOS = 4
+
+
+class AssetCache:
+    """Keep decoded images, open media readers and the proverb list in memory.
+
+    The reel scripts used to reopen every file for every video. When several
+    reels are rendered in one process (see batch_render.py) the same handful
+    of images, music tracks and background videos are reused, so they are
+    loaded once here and shared between jobs.
+
+    Clips handed out by the cache are owned by the cache: callers must not
+    close them, only ``AssetCache.close()`` does. Only the ``max_videos``
+    most recently used background videos are kept open, older ones are
+    closed when a new one is opened.
+
+    Background videos are read from their proxy in ``proxy_dir`` (see
+    proxy_cache.py) when one was made with the requested settings;
+    ``proxy_dir=None`` always reads the original files.
+    """
+
+    def __init__(self, images_folder=images_folder, videos_folder=videos_folder,
+                 music_folder=music_folder, proverbs_file=proverbs_file, proxy_dir=PROXY_DIR,
+                 max_videos=MAX_OPEN_VIDEOS):
+        self.proxy_dir = proxy_dir
+        self.max_videos = max_videos
+        self.images_folder = images_folder
+        self.videos_folder = videos_folder
+        self.music_folder = music_folder
+        self.proverbs_file = proverbs_file
+
+        self._index = None
+        self._proverbs = None
+        self._images = {}
+        self._music = {}
+        self._videos = OrderedDict()
+
+    # Folder listings, read from the asset index so unreadable files are
+    # skipped and nothing is opened just to be listed
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = AssetIndex(folders={'image': self.images_folder,
+                                              'video': self.videos_folder,
+                                              'music': self.music_folder})
+            self._index.refresh()
+        return self._index
+
+    def image_files(self):
+        return self.index.files('image')
+
+    def video_files(self):
+        return self.index.files('video')
+
+    def music_files(self, extensions=None):
+        files = self.index.files('music')
+        if extensions:
+            files = [f for f in files if f.lower().endswith(extensions)]
+        return files
+
+    def proverbs(self):
+        if self._proverbs is None:
+            with open(self.proverbs_file, "r", encoding="utf-8") as f:
+                self._proverbs = [line.strip() for line in f if line.strip()]
+        return self._proverbs
+
+    # Decoded assets
+
+    def image(self, path, width=None):
+        """Return the ImageClip for ``path``, resized to ``width`` if given."""
+        key = (path, width)
+        if key not in self._images:
+            clip = self._images.get((path, None))
+            if clip is None:
+                clip = ImageClip(path)
+                self._images[(path, None)] = clip
+            if width is not None:
+                self._images[key] = clip.resized(width=width)
+        return self._images[key]
+
+    def music(self, path, start=0, end=None):
+        """Return an audio clip of ``path`` from ``start`` to ``end`` seconds.
+
+        The track is decoded once to memory-mapped PCM (see audio_cache.py)
+        and every clip is a zero-copy slice of it.
+        """
+        if path not in self._music:
+            self._music[path] = load_music(path)
+        return music_clip(self._music[path], start, end)
+
+    def video(self, path, width=None, height=None, crop=None, upscale=True, prefetch=0,
+              threads=None, pixel_format='rgb24', fps=None, keyframe_seek=False):
+        """Return an open video clip for ``path``.
+
+        The optional size and crop are applied by ffmpeg while decoding (see
+        background_reader.py), so callers don't need ``clip.resized()``.
+        With ``prefetch`` frames are decoded ahead in a background thread,
+        ``threads`` limits the decoder threads. ``pixel_format='yuv420p'``
+        gives I420 frames for the yuv420p render path. ``fps`` is the frame
+        rate the caller renders at, which a proxy may be made for. With
+        ``keyframe_seek`` seeks into the original file go straight to the
+        keyframe before the wanted time, if its keyframes are already known
+        (see ``AssetIndex.keyframes``); they are not probed for this.
+        """
+        key = (path, width, height, crop, upscale, prefetch, threads, pixel_format, fps,
+               keyframe_seek)
+        if key not in self._videos:
+            while len(self._videos) >= self.max_videos:
+                _, clip = self._videos.popitem(last=False)
+                clip.close()
+            source = path
+            if self.proxy_dir is not None and crop is None:
+                # A proxy has the target size already, the reader's scale is a no-op
+                settings = proxy_settings(width, height, upscale, fps)
+                source = find_proxy(path, self.index.get(path), settings, self.proxy_dir) or path
+            # Proxies have a keyframe every second, only long originals need the index
+            keyframes = None
+            if keyframe_seek and source == path:
+                keyframes = self.index.keyframes(path, probe=False)
+            self._videos[key] = BackgroundVideoClip(source, width=width, height=height,
+                                                    crop=crop, upscale=upscale,
+                                                    prefetch=prefetch, threads=threads,
+                                                    pixel_format=pixel_format,
+                                                    keyframes=keyframes)
+        else:
+            self._videos.move_to_end(key)
+            # The previous render may have blended its text into the buffered
+            # frames, and grown the ring to hold its queued frames
+            self._videos[key].reader.release_frames()
+        return self._videos[key]
+
+    def close(self):
+        for clip in self._videos.values():
+            clip.close()
+        self._images.clear()
+        self._music.clear()
+        self._videos.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
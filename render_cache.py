@@ -0,0 +1,87 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+from asset_index import file_digest
+from disk_cache import evict_lru
+
+CACHE_DIR = os.path.join(".cache", "renders")
+MAX_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+_code_version = None
+
+
+def code_version():
+    """Digest of the reel scripts and their helper modules.
+
+    Any change to the rendering code changes every render key, so a cached
+    reel is never served for code that would now render it differently.
+    """
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(here, "*.py"))):
+            digest.update(os.path.basename(path).encode("utf-8"))
+            digest.update(file_digest(path).encode("utf-8"))
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def render_key(spec, input_files, digest=file_digest):
+    """Content address of a render: the full spec plus the digest of every input file.
+
+    ``digest`` computes a file's digest; pass ``AssetIndex.digest`` to reuse
+    digests remembered in the asset index.
+    """
+    key_data = {
+        'spec': spec,
+        'inputs': {name: digest(path) for name, path in sorted(input_files.items())},
+        'code': code_version(),
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _place(source, destination):
+    """Make ``destination`` a hard link to ``source``, or a copy across filesystems."""
+    if os.path.dirname(destination):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def cached_render(key, output_path, render, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Produce ``output_path`` for render ``key``, calling ``render()`` only on a cache miss.
+
+    On a hit the cached file is hard linked (or copied) to ``output_path``.
+    On a miss the output is rendered and a copy is stored in the cache; the
+    oldest entries are evicted beyond ``max_bytes`` (0 disables storing).
+    Returns True on a cache hit.
+    """
+    ext = os.path.splitext(output_path)[1]
+    cached_path = os.path.join(cache_dir, key + ext)
+
+    if os.path.exists(cached_path) and os.path.getsize(cached_path) > 0:
+        os.utime(cached_path)  # Mark as recently used
+        _place(cached_path, output_path)
+        return True
+
+    # The output may be a hard link to a cache entry from an earlier run:
+    # unlink it so ffmpeg writes a new file instead of truncating the entry
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+    render()
+
+    if max_bytes > 0:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+        shutil.copy2(output_path, tmp_path)
+        os.replace(tmp_path, cached_path)
+        evict_lru(cache_dir, max_bytes)
+    return False
@@ -0,0 +1,225 @@
+import math
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import proglog
+
+from overlay_compositor import overlay_layers
+from streamed_export import AUDIO_FPS, StreamEncoder, clip_audio, write_streamed_videofile
+
+# Frames waiting between two stages; a full queue makes the stage before it wait
+QUEUE_SIZE = 4
+
+
+class StageTimer:
+    """How long a pipeline stage worked and how long it waited on its queues."""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.waiting = 0.0
+        self.started = None
+        self.finished = None
+
+    @property
+    def busy(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started - self.waiting
+
+
+class _Stopped(Exception):
+    """Raised in a stage when another stage failed."""
+
+
+def _put(frames, item, stop, timer):
+    started = time.perf_counter()
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            frames.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            pass
+    timer.waiting += time.perf_counter() - started
+
+
+def _get(frames, stop, timer):
+    started = time.perf_counter()
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            item = frames.get(timeout=0.1)
+            break
+        except queue.Empty:
+            pass
+    timer.waiting += time.perf_counter() - started
+    return item
+
+
+def _run_stage(timer, stop, errors, work):
+    """Run ``work()`` as a stage thread body, turning its failure into a pipeline stop."""
+    timer.started = time.perf_counter()
+    try:
+        work()
+    except _Stopped:
+        pass
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        timer.finished = time.perf_counter()
+
+
+def print_stage_report(timers):
+    slowest = max(timers, key=lambda timer: timer.busy)
+    print("⏱️ Pipeline stages:")
+    for timer in timers:
+        per_frame = timer.busy / timer.frames * 1000 if timer.frames else 0.0
+        marker = "  <- bottleneck" if timer is slowest else ""
+        print(f"   {timer.name:<8} {timer.busy:6.2f}s busy, {timer.waiting:6.2f}s waiting, "
+              f"{per_frame:6.1f} ms/frame{marker}")
+
+
+def write_pipelined_videofile(clip, output_path, fps, codec='libx264', audio_codec='aac',
+                              bitrate=None, audio_bitrate=None, preset='medium',
+                              audio_fps=AUDIO_FPS, threads=None, pixel_format='yuv420p',
+                              ffmpeg_params=None, logger="bar", queue_size=QUEUE_SIZE,
+                              report=True, budget=None, input_pixel_format='rgb24'):
+    """Like ``write_streamed_videofile``, with decode, compose and encode as concurrent stages.
+
+    For a clip made by ``StaticOverlay.apply_to`` a decode thread reads the
+    background frames, a compose thread blends the overlay and the calling
+    thread feeds the encoder. The stages are connected by bounded queues of
+    ``queue_size`` frames, so the slowest stage sets the frame rate while the
+    others work ahead or wait. Any other clip is rendered by the decode
+    thread (``clip.get_frame``) and only encoding runs concurrently.
+    Per-stage busy and waiting times are printed at the end with ``report``.
+
+    A CpuBudget passed as ``budget`` sizes the encoder threads; with a
+    single core the frames are rendered without the stage threads.
+    ``input_pixel_format='yuv420p'`` is for clips whose frames are I420
+    arrays, like a yuv420p background with a PlanarOverlay.
+    """
+    if (clip.audio is not None and os.name == 'nt') or (budget is not None and not budget.pipelined):
+        # The encoder's audio pipe isn't available on Windows, and stage
+        # threads would only contend for a single core
+        return write_streamed_videofile(clip, output_path, fps, codec=codec, audio_codec=audio_codec,
+                                        bitrate=bitrate, audio_bitrate=audio_bitrate, preset=preset,
+                                        audio_fps=audio_fps, threads=threads,
+                                        pixel_format=pixel_format, ffmpeg_params=ffmpeg_params,
+                                        logger=logger, budget=budget,
+                                        input_pixel_format=input_pixel_format)
+
+    if budget is not None:
+        ffmpeg_params = budget.encoder_params(codec, ffmpeg_params)
+    encoder = StreamEncoder(output_path, clip.size, fps, clip_audio(clip), codec=codec,
+                            audio_codec=audio_codec, bitrate=bitrate, audio_bitrate=audio_bitrate,
+                            preset=preset, audio_fps=audio_fps, threads=threads,
+                            pixel_format=pixel_format, ffmpeg_params=ffmpeg_params,
+                            input_pixel_format=input_pixel_format)
+    return pipe_frames(clip, encoder, fps, logger=logger, queue_size=queue_size, report=report)
+
+
+def pipe_frames(clip, encoder, fps, logger="bar", queue_size=QUEUE_SIZE, report=True):
+    """Feed the frames of ``clip`` to a started StreamEncoder through the decode/compose/encode stages.
+
+    See ``write_pipelined_videofile``. The encoder is closed at the end (or
+    killed on error) and its ``output_path`` returned.
+    """
+    layers = overlay_layers(clip)
+    if layers is not None:
+        background, overlay, in_place, blended = layers
+        get_frame = background.get_frame
+        reader = getattr(background, 'reader', None)
+        if hasattr(reader, 'hold_frames'):
+            # Reader frames travel through both queues before they are
+            # encoded. Above the output fps the reader skips source frames
+            # in between, and each one is read into the ring too
+            reader.hold_frames((2 * queue_size + 4) * max(1, math.ceil(reader.fps / fps)))
+    else:
+        overlay, in_place, get_frame, blended = None, False, clip.get_frame, None
+
+    n_frames = int(clip.duration * fps)
+    decoded, composed = queue.Queue(queue_size), queue.Queue(queue_size)
+    # Output buffers for frames that can't be blended in place
+    free_buffers = queue.Queue()
+    if overlay is not None:
+        for _ in range(queue_size + 2):
+            free_buffers.put(np.empty(overlay.frame_shape(clip.size), dtype=np.uint8))
+
+    stop = threading.Event()
+    errors = []
+    timers = [StageTimer("decode"), StageTimer("compose"), StageTimer("encode")]
+    decode_timer, compose_timer, encode_timer = timers
+
+    def decode():
+        for i in range(n_frames):
+            frame = get_frame(i / fps)
+            decode_timer.frames += 1
+            _put(decoded, frame, stop, decode_timer)
+
+    def compose():
+        last_frame = last_out = None
+        if blended is not None:
+            # The first frame may be blended already, by the clip itself
+            last_frame, last_out = blended['input'], blended['output']
+        last_pooled = False
+        for _ in range(n_frames):
+            frame = _get(decoded, stop, compose_timer)
+            if overlay is None:
+                out, pooled = frame, False
+            elif frame is last_frame:
+                # The reader handed out the same frame again: it is blended already
+                pooled = last_pooled
+                out = last_out
+                if pooled:
+                    out = _get(free_buffers, stop, compose_timer)
+                    np.copyto(out, last_out)
+            elif in_place and overlay.can_blend_in_place(frame):
+                out, pooled = overlay.blend(frame, out=frame), False
+            else:
+                out = overlay.blend(frame, out=_get(free_buffers, stop, compose_timer))
+                pooled = True
+            last_frame, last_out, last_pooled = frame, out, pooled
+            compose_timer.frames += 1
+            _put(composed, (out, pooled), stop, compose_timer)
+        if blended is not None:
+            # The last buffer is not handed out again, so the clip can reuse it
+            blended['input'], blended['output'] = last_frame, last_out
+
+    stages = [threading.Thread(target=_run_stage, args=(timer, stop, errors, work), daemon=True)
+              for timer, work in ((decode_timer, decode), (compose_timer, compose))]
+    for stage in stages:
+        stage.start()
+
+    logger = proglog.default_bar_logger(logger)
+    encode_timer.started = time.perf_counter()
+    try:
+        for _ in logger.iter_bar(frame_index=range(n_frames)):
+            out, pooled = _get(composed, stop, encode_timer)
+            encoder.write_frame(out)
+            if pooled:
+                free_buffers.put(out)
+            encode_timer.frames += 1
+    except _Stopped:
+        encoder.kill()
+        raise errors[0]
+    except BaseException:
+        stop.set()
+        encoder.kill()
+        raise
+    finally:
+        encode_timer.finished = time.perf_counter()
+        for stage in stages:
+            stage.join()
+
+    encoder.close()
+    if report:
+        print_stage_report(timers)
+    return encoder.output_path
@@ -0,0 +1,152 @@
+import os
+
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import ffmpeg_escape_filename, subprocess_call
+
+from cpu_budget import split_budget
+from render_pipeline import QUEUE_SIZE, pipe_frames
+from resumable_export import spool_lossless
+from streamed_export import AUDIO_FPS, StreamEncoder, clip_audio
+
+# Platform targets from QUALITY_IMPROVEMENTS.md. A rendition may also set
+# 'crop' (x, y, width, height in composition pixels, default: the centred
+# crop to its aspect ratio), 'codec', 'preset', 'crf' and 'audio_codec'
+RENDITIONS = {
+    'reels': {'size': (1080, 1920), 'fps': 30, 'bitrate': '3000k'},   # Instagram Reels/TikTok, 9:16
+    'shorts': {'size': (1080, 1920), 'fps': 30, 'bitrate': '4000k'},  # YouTube Shorts re-encodes, start higher
+    'feed': {'size': (1080, 1080), 'fps': 30, 'bitrate': '3000k'},    # Instagram Feed, 1:1
+}
+
+
+def rendition_path(output_path, name):
+    """``reel.mp4`` -> ``reel_<name>.mp4``."""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_{name}{ext or '.mp4'}"
+
+
+def resolve_renditions(renditions, output_path):
+    """Settings of each rendition, with the file it is written to under 'output'.
+
+    Entries are preset names from RENDITIONS or dicts with at least 'size'
+    (and 'name' or 'output'). Unless set, outputs are named after
+    ``output_path`` with the rendition name appended.
+    """
+    resolved = []
+    for i, rendition in enumerate(renditions):
+        if isinstance(rendition, str):
+            rendition = dict(RENDITIONS[rendition], name=rendition)
+        rendition = dict(rendition)
+        rendition.setdefault('name', f"rendition{i + 1}")
+        rendition.setdefault('output', rendition_path(output_path, rendition['name']))
+        resolved.append(rendition)
+    return resolved
+
+
+def _centered_crop(size, target_size):
+    """The largest centred crop of ``size`` with the aspect ratio of ``target_size``."""
+    w, h = size
+    tw, th = target_size
+    if w * th > h * tw:
+        cw, ch = min(w, round(h * tw / th / 2) * 2), h
+    else:
+        cw, ch = w, min(h, round(w * th / tw / 2) * 2)
+    return ((w - cw) // 2, (h - ch) // 2, cw, ch)
+
+
+def rendition_filter(size, fps, rendition):
+    """The ffmpeg filter chain turning ``size``/``fps`` composition frames into the rendition."""
+    x, y, cw, ch = rendition.get('crop') or _centered_crop(size, rendition['size'])
+    chain = []
+    if (cw, ch) != tuple(size):
+        chain.append("crop=%d:%d:%d:%d" % (cw, ch, x, y))
+    if (cw, ch) != tuple(rendition['size']):
+        chain.append("scale=%d:%d:flags=bicubic" % tuple(rendition['size']))
+    if rendition.get('fps', fps) != fps:
+        chain.append("fps=%s" % rendition['fps'])
+    return ",".join(chain) or "null"
+
+
+def rendition_args(size, fps, renditions, video_input, audio_input=None, budget=None):
+    """ffmpeg output arguments encoding every rendition from one decoded video input.
+
+    The frames of ``video_input`` are split once inside ffmpeg and each
+    branch is cropped, scaled and encoded on its own, with ``audio_input``
+    muxed into every file. ``budget`` is shared between the encoders.
+    """
+    labels = [f"r{i}" for i in range(len(renditions))]
+    graph = f"[{video_input}]split={len(renditions)}" + "".join(f"[s{label}]" for label in labels)
+    for label, rendition in zip(labels, renditions):
+        graph += f";[s{label}]{rendition_filter(size, fps, rendition)}[{label}]"
+
+    encoder_budget = split_budget(budget, len(renditions))
+    args = ["-filter_complex", graph]
+    for label, rendition in zip(labels, renditions):
+        codec = rendition.get('codec', 'libx264')
+        args += ["-map", f"[{label}]"]
+        if audio_input is not None:
+            args += ["-map", audio_input]
+        args += ["-vcodec", codec, "-preset", rendition.get('preset', 'medium')]
+        if rendition.get('crf') is not None:
+            args += ["-crf", str(rendition['crf'])]
+        elif rendition.get('bitrate') is not None:
+            args += ["-b:v", rendition['bitrate']]
+        # yuv420p needs even dimensions, like in moviepy's own writer
+        if rendition['size'][0] % 2 == 0 and rendition['size'][1] % 2 == 0:
+            args += ["-pix_fmt", "yuv420p"]
+        if encoder_budget is not None:
+            args += encoder_budget.encoder_params(codec)
+        if audio_input is not None:
+            args += ["-acodec", rendition.get('audio_codec', 'aac')]
+        args += [ffmpeg_escape_filename(rendition['output'])]
+    return args
+
+
+class RenditionEncoder(StreamEncoder):
+    """A StreamEncoder writing several renditions of the same frames in one ffmpeg process.
+
+    ``renditions`` come from ``resolve_renditions``; ``output_path`` is
+    the list of their files.
+    """
+
+    def __init__(self, renditions, size, fps, audio=None, audio_fps=AUDIO_FPS, budget=None):
+        args = rendition_args(size, fps, renditions, "0:v", "1:a:0" if audio is not None else None,
+                              budget=budget)
+        self._start([r['output'] for r in renditions], size, fps, audio, audio_fps, args)
+
+
+def encode_renditions(path, size, fps, renditions, logger="bar", budget=None):
+    """Encode the lossless render at ``path`` (see resumable_export.py) into every rendition."""
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error"]
+    if budget is not None:
+        cmd += budget.decoder_params()
+    cmd += ["-i", ffmpeg_escape_filename(path)]
+    cmd += rendition_args(size, fps, renditions, "0:v", "0:a?", budget=budget)
+    subprocess_call(cmd, logger=logger)
+    return [r['output'] for r in renditions]
+
+
+def write_renditions(clip, renditions, output_path, fps=None, logger="bar",
+                     queue_size=QUEUE_SIZE, budget=None):
+    """Render ``clip`` once and encode it into several platform renditions.
+
+    ``renditions`` are preset names or settings (see resolve_renditions).
+    The frames are composited once, at ``fps`` (default: the highest
+    rendition fps), and piped to a single ffmpeg process that splits them
+    between one encoder per rendition. Returns the written files.
+    """
+    renditions = resolve_renditions(renditions, output_path)
+    fps = fps or max(r.get('fps', clip.fps) for r in renditions)
+
+    if clip.audio is not None and os.name == 'nt':
+        # No audio pipe on Windows: go through a lossless file instead
+        spool_path = f"{os.path.splitext(output_path)[0]}.{os.getpid()}.spool.mkv"
+        try:
+            spool_lossless(clip, spool_path, fps, logger=logger, budget=budget)
+            return encode_renditions(spool_path, clip.size, fps, renditions, logger=logger,
+                                     budget=budget)
+        finally:
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
+
+    encoder = RenditionEncoder(renditions, clip.size, fps, clip_audio(clip), budget=budget)
+    return pipe_frames(clip, encoder, fps, logger=logger, queue_size=queue_size)
@@ -0,0 +1,60 @@
+import os
+
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import ffmpeg_escape_filename, subprocess_call
+
+from render_pipeline import write_pipelined_videofile
+
+def spool_lossless(clip, path, fps, logger="bar", budget=None, pixel_format='rgb24'):
+    """Render ``clip`` once to a lossless file at ``path``.
+
+    The file only appears under its final name once it is complete, so an
+    encode that fails afterwards (see ``encode_intermediate``) can start
+    from every frame already rendered. The caller deletes it when done.
+    The frames are stored as they are composited: RGB, or yuv420p for a
+    clip of I420 frames with ``pixel_format='yuv420p'``. That costs one
+    lossless encode here and one decode per later encode, on top of the
+    delivery encode.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.mkv"
+    try:
+        yuv = pixel_format == 'yuv420p'
+        write_pipelined_videofile(clip, tmp_path, fps=fps,
+                                  codec='libx264' if yuv else 'libx264rgb', audio_codec='flac',
+                                  preset='ultrafast', pixel_format='yuv420p' if yuv else None,
+                                  ffmpeg_params=["-qp", "0"], logger=logger, budget=budget,
+                                  input_pixel_format=pixel_format)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def encode_intermediate(path, output_path, size, fps, codec='libx264', audio_codec='aac',
+                        bitrate=None, preset='medium', crf=None, logger="bar", budget=None):
+    """Encode the lossless render at ``path`` into the delivery file ``output_path``.
+
+    ``crf`` selects constant quality encoding instead of a target ``bitrate``.
+    A CpuBudget passed as ``budget`` sizes the decoder and encoder threads.
+    """
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error"]
+    if budget is not None:
+        cmd += budget.decoder_params()
+    cmd += [
+        "-i", ffmpeg_escape_filename(path),
+        "-r", "%.02f" % fps, "-vcodec", codec, "-preset", preset,
+    ]
+    # yuv420p needs even dimensions, like in moviepy's own writer
+    if size[0] % 2 == 0 and size[1] % 2 == 0:
+        cmd += ["-pix_fmt", "yuv420p"]
+    if crf is not None:
+        cmd += ["-crf", str(crf)]
+    elif bitrate is not None:
+        cmd += ["-b:v", bitrate]
+    if budget is not None:
+        cmd += budget.encoder_params(codec)
+    cmd += ["-acodec", audio_codec, ffmpeg_escape_filename(output_path)]
+    subprocess_call(cmd, logger=logger)
+    return output_path
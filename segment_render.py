@@ -0,0 +1,200 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from moviepy import AudioFileClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import ffmpeg_escape_filename, subprocess_call
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+import create_video_with_video_bg_enhanced as reel_script
+from asset_index import probe_asset
+from background_reader import output_size
+from background_window import pick_start
+from cpu_budget import CpuBudget, split_budget
+from reel_assets import AssetCache
+from streamed_export import FramePipe
+
+# Seconds between keyframes; segment boundaries fall on multiples of it
+GOP_SECONDS = 2
+
+
+def segment_bounds(n_frames, segments, gop):
+    """Split frames ``0..n_frames`` into at most ``segments`` ranges starting on GOP boundaries."""
+    n_gops = -(-n_frames // gop)
+    segments = max(1, min(segments, n_gops))
+    bounds = [round(i * n_gops / segments) * gop for i in range(segments + 1)]
+    bounds[-1] = n_frames
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def encoder_params(gop):
+    """Fixed keyframe cadence, so every segment starts on an IDR frame of the same GOP grid."""
+    return ["-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0"]
+
+
+def _render_segment(background_video_path, music_path, proverb, max_duration, start,
+                    first_frame, last_frame, settings, gop, path, budget):
+    """Compose the reel in this process and encode frames ``first_frame..last_frame``."""
+    with AssetCache(videos_folder=reel_script.videos_folder, music_folder=reel_script.music_folder,
+                    proverbs_file=reel_script.proverbs_file) as assets:
+        video, _ = reel_script.compose_reel(background_video_path, music_path, proverb, assets,
+                                            max_duration=max_duration, budget=budget, start=start)
+        fps = settings['fps']
+        with FFMPEG_VideoWriter(path, video.size, fps, codec=settings['codec'],
+                                preset=settings.get('preset', 'medium'),
+                                bitrate=settings.get('bitrate'),
+                                ffmpeg_params=budget.encoder_params(settings['codec'],
+                                                                    encoder_params(gop))) as writer:
+            pipe = FramePipe(writer.proc.stdin, video.size)
+            # Frame i is taken at i / fps, exactly as in a single-process render
+            for i in range(first_frame, last_frame):
+                pipe.write(video.get_frame(i / fps))
+            # moviepy's writer doesn't check how ffmpeg exited, so end it here
+            writer.proc.stdin.close()
+            returncode = writer.proc.wait()
+    if returncode != 0 or not os.path.exists(path) or os.path.getsize(path) == 0:
+        raise IOError(f"Encoding segment {path} (frames {first_frame}-{last_frame}) failed "
+                      f"with ffmpeg exit code {returncode}")
+    return path
+
+
+def _background_info(assets, background_video_path):
+    """Size, duration and audio presence of the background, without opening a reader."""
+    entry = assets.index.get(background_video_path)
+    if entry is None:
+        entry = probe_asset(background_video_path, 'video')
+    return ((entry['width'], entry['height']),
+            entry.get('video_duration') or entry['duration'], entry['has_audio'])
+
+
+def _concat(segment_paths, audio_path, output_path, work_dir):
+    """Join the encoded segments and the audio track without re-encoding anything."""
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", ffmpeg_escape_filename(list_path),
+    ]
+    if audio_path is not None:
+        cmd += ["-i", ffmpeg_escape_filename(audio_path), "-map", "0:v:0", "-map", "1:a:0"]
+    cmd += ["-c", "copy", "-movflags", "+faststart", ffmpeg_escape_filename(output_path)]
+    subprocess_call(cmd, logger=None)
+
+
+def render_segmented(background_video_path, music_path, proverb, output_path, workers=None,
+                     max_duration=None, budget=None, start=None):
+    """Render one enhanced video-bg reel split across ``workers`` processes.
+
+    The timeline is cut into GOP aligned segments that are composed and
+    encoded in parallel with identical encoder settings, while this process
+    encodes the soundtrack. The pieces are then joined with the concat
+    demuxer by stream copy.
+
+    ``budget`` (a CpuBudget, default: every core) is the CPU share of the
+    whole render. It is split evenly between the workers, one per core
+    unless ``workers`` says otherwise, so their encoders don't contend.
+
+    ``start`` is where the reel starts in the background, like for
+    ``render_reel`` (default: the script's ``background_start``).
+    """
+    budget = budget or CpuBudget(os.cpu_count() or 1)
+    workers = workers or budget.cores
+    # Resolved here, the workers import the script afresh
+    if max_duration is None:
+        max_duration = reel_script.max_duration
+    if start is None:
+        start = reel_script.background_start
+
+    with AssetCache(videos_folder=reel_script.videos_folder, music_folder=reel_script.music_folder,
+                    proverbs_file=reel_script.proverbs_file) as assets:
+        if isinstance(start, str):
+            # Picked once, every segment must use the same window
+            start = pick_start(assets.index, background_video_path, max_duration, mode=start)
+        source_size, background_duration, has_audio = _background_info(assets, background_video_path)
+        # Same window and size as compose_reel, without decoding anything here
+        start = min(start, max(0, background_duration - 1))
+        duration = min(max_duration, background_duration - start)
+        size = output_size(source_size, width=1080, upscale=False)
+
+        settings = reel_script.pick_export_settings(size[0])
+        fps = settings['fps']
+        gop = max(1, round(GOP_SECONDS * fps))
+        segments = segment_bounds(int(duration * fps), workers, gop)
+        print(f"🎬 Rendering {duration:.1f}s in {len(segments)} segment(s) "
+              f"on {min(workers, len(segments))} worker processes")
+        segment_budget = split_budget(budget, min(workers, len(segments)))
+
+        work_dir = tempfile.mkdtemp(prefix="reel_segments_")
+        try:
+            segment_paths = [os.path.join(work_dir, f"segment_{i:03d}.mp4")
+                             for i in range(len(segments))]
+            with ProcessPoolExecutor(max_workers=min(workers, len(segments))) as pool:
+                futures = [pool.submit(_render_segment, background_video_path, music_path, proverb,
+                                       max_duration, start, first, last, settings, gop, path,
+                                       segment_budget)
+                           for (first, last), path in zip(segments, segment_paths)]
+
+                # The soundtrack is encoded here while the workers render
+                background_audio = None
+                if has_audio:
+                    background_audio = AudioFileClip(background_video_path).subclipped(
+                        start, start + duration)
+                try:
+                    audio = reel_script.process_audio_for_video(music_path, duration,
+                                                                background_audio, assets=assets)
+                    audio_path = os.path.join(work_dir, "audio.m4a")
+                    audio.write_audiofile(audio_path, fps=44100, codec=settings['audio_codec'],
+                                          logger=None)
+                finally:
+                    if background_audio is not None:
+                        background_audio.close()
+
+                for future in futures:
+                    future.result()
+
+            _concat(segment_paths, audio_path, output_path, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render one enhanced video-background reel on several processes.")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="number of render processes, 0 for one per core of the budget "
+                             "(default: 0)")
+    parser.add_argument('--cpus', type=int, default=0,
+                        help="CPU cores the render may use, 0 for all of them (default: 0)")
+    parser.add_argument('--duration', type=float, default=reel_script.max_duration,
+                        help="longest reel length in seconds (default: %(default)s)")
+    parser.add_argument('--output', default=reel_script.output_path,
+                        help="output file (default: %(default)s)")
+    args = parser.parse_args()
+
+    with AssetCache(videos_folder=reel_script.videos_folder, music_folder=reel_script.music_folder,
+                    proverbs_file=reel_script.proverbs_file) as assets:
+        background_video_path, music_path, proverb = reel_script.pick_inputs(assets)
+    print(f"Using background video: {background_video_path}")
+    print(f"Using music: {music_path}")
+    print(f"Using proverb: {proverb}")
+
+    started = time.time()
+    render_segmented(background_video_path, music_path, proverb, args.output,
+                     workers=args.workers, max_duration=args.duration,
+                     budget=CpuBudget(args.cpus) if args.cpus else None)
+    print(f"Video saved as {args.output} in {time.time() - started:.1f} seconds")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
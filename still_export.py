@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+from moviepy import ImageClip, CompositeVideoClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import ffmpeg_escape_filename, subprocess_call
+from PIL import Image
+
+
+def is_static_clip(clip):
+    """Return True if every frame of ``clip`` is the same picture.
+
+    That is the case for an ImageClip (TextClip and ColorClip included) and
+    for a CompositeVideoClip made only of such clips that stay in place and
+    are visible for the whole composition.
+    """
+    if isinstance(clip, ImageClip):
+        return clip.mask is None or isinstance(clip.mask, ImageClip)
+
+    if isinstance(clip, CompositeVideoClip):
+        if not is_static_clip(clip.bg):
+            return False
+        for layer in clip.clips:
+            if not is_static_clip(layer):
+                return False
+            if layer.start > 0 or (layer.end is not None and clip.end is not None
+                                   and layer.end < clip.end):
+                return False
+            if clip.duration and layer.pos(0) != layer.pos(clip.duration):
+                return False
+        return True
+
+    return False
+
+
+def write_still_videofile(frame, output_path, duration, fps, audio_path=None, audio_start=0,
+                          codec='libx264', audio_codec='aac', bitrate=None, preset='medium',
+                          logger="bar", budget=None):
+    """Encode a single frame looped for ``duration`` seconds, muxed with music.
+
+    Instead of compositing and piping every identical frame, the picture is
+    handed to ffmpeg once as a looped still image input and x264 is tuned for
+    still content. The music is read straight from ``audio_path``.
+    A CpuBudget passed as ``budget`` sizes the encoder threads.
+    """
+    height, width = frame.shape[:2]
+
+    handle, frame_path = tempfile.mkstemp(suffix=".png")
+    os.close(handle)
+    try:
+        Image.fromarray(frame[:, :, :3].astype("uint8")).save(frame_path, compress_level=1)
+
+        cmd = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-loop", "1", "-framerate", "%.02f" % fps,
+            "-i", ffmpeg_escape_filename(frame_path),
+        ]
+        if audio_path is not None:
+            cmd += ["-ss", "%.06f" % audio_start, "-t", "%.06f" % duration,
+                    "-i", ffmpeg_escape_filename(audio_path)]
+
+        cmd += ["-t", "%.06f" % duration, "-r", "%.02f" % fps, "-vcodec", codec]
+        if codec == 'libx264':
+            cmd += ["-preset", preset, "-tune", "stillimage"]
+        if bitrate is not None:
+            cmd += ["-b:v", bitrate]
+        # yuv420p needs even dimensions, like in moviepy's own writer
+        if width % 2 == 0 and height % 2 == 0:
+            cmd += ["-pix_fmt", "yuv420p"]
+        if budget is not None:
+            cmd += budget.encoder_params(codec)
+        if audio_path is not None:
+            cmd += ["-acodec", audio_codec, "-map", "0:v:0", "-map", "1:a:0"]
+        cmd += [ffmpeg_escape_filename(output_path)]
+
+        subprocess_call(cmd, logger=logger)
+    finally:
+        os.remove(frame_path)
+
+    return output_path
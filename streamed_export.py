@@ -0,0 +1,222 @@
+import os
+import subprocess as sp
+import threading
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import cross_platform_popen_params, ffmpeg_escape_filename
+
+AUDIO_FPS = 44100
+AUDIO_CHUNK_SECONDS = 0.5
+
+
+class FramePipe:
+    """Writes frames to an ffmpeg rawvideo (rgb24) pipe without per-frame allocations.
+
+    A C-contiguous uint8 RGB frame is written straight from its memory
+    through a memoryview. Anything else (an RGBA or float frame, a strided
+    view) is converted into one of a ring of preallocated buffers first,
+    instead of ``astype``/``tobytes`` creating new full-size arrays per frame.
+    With ``pixel_format='yuv420p'`` the frames are I420 arrays of shape
+    (height * 3 // 2, width) instead.
+    """
+
+    def __init__(self, stream, size, buffers=2, pixel_format='rgb24'):
+        w, h = size
+        self.stream = stream
+        self._shape = (h * 3 // 2, w) if pixel_format == 'yuv420p' else (h, w, 3)
+        self._ring = [np.empty(self._shape, dtype=np.uint8) for _ in range(buffers)]
+        self._views = [memoryview(buffer).cast("B") for buffer in self._ring]
+        self._next = 0
+
+    def write(self, frame):
+        if frame.dtype == np.uint8 and frame.shape == self._shape and frame.flags.c_contiguous:
+            self.stream.write(memoryview(frame).cast("B"))
+            return
+        i = self._next
+        self._next = (i + 1) % len(self._ring)
+        if len(self._shape) == 3:
+            frame = frame[:, :, :3]
+        np.copyto(self._ring[i], frame, casting='unsafe')
+        self.stream.write(self._views[i])
+
+
+def _feed_audio(audio, fd, fps, errors):
+    """Write the audio of the clip as raw float32 PCM to ``fd``, chunk by chunk."""
+    try:
+        with os.fdopen(fd, "wb") as pipe:
+            for chunk in audio.iter_chunks(chunk_duration=AUDIO_CHUNK_SECONDS, fps=fps):
+                pipe.write(np.asarray(chunk, dtype=np.float32).tobytes())
+    except BrokenPipeError:
+        pass  # ffmpeg stopped reading, its own error is reported by the video side
+    except Exception as e:
+        errors.append(e)
+
+
+class StreamEncoder:
+    """One ffmpeg process encoding rgb24 frames from stdin, plus an optional audio clip.
+
+    The audio is streamed as raw PCM through a second pipe by a thread, so
+    it is mixed and encoded while the frames are being produced. Feed frames
+    with ``write_frame()``, then call ``close()`` (or ``kill()`` on error).
+    ``pixel_format=None`` hands the RGB frames to the encoder unconverted.
+    An already encoded soundtrack can be given as ``audio_path`` instead of
+    ``audio``; it is muxed without re-encoding. ``input_pixel_format`` is
+    the layout of the frames written, rgb24 or yuv420p (see FramePipe).
+    """
+
+    def __init__(self, output_path, size, fps, audio=None, codec='libx264', audio_codec='aac',
+                 bitrate=None, audio_bitrate=None, preset='medium', audio_fps=AUDIO_FPS,
+                 threads=None, pixel_format='yuv420p', ffmpeg_params=None, audio_path=None,
+                 input_pixel_format='rgb24'):
+        width, height = size
+        cmd = []
+        if audio is not None or audio_path is not None:
+            cmd += ["-map", "0:v:0", "-map", "1:a:0"]
+        cmd += ["-vcodec", codec, "-preset", preset]
+        if bitrate is not None:
+            cmd += ["-b:v", bitrate]
+        if threads is not None:
+            cmd += ["-threads", str(threads)]
+        # yuv420p needs even dimensions, like in moviepy's own writer
+        if pixel_format == 'yuv420p' and (width % 2 or height % 2):
+            pixel_format = None
+        if pixel_format is not None:
+            cmd += ["-pix_fmt", pixel_format]
+        if ffmpeg_params is not None:
+            cmd += ffmpeg_params
+        if audio is not None:
+            cmd += ["-acodec", audio_codec]
+            if audio_bitrate is not None:
+                cmd += ["-b:a", audio_bitrate]
+        elif audio_path is not None:
+            cmd += ["-acodec", "copy"]
+        cmd += [ffmpeg_escape_filename(output_path)]
+        self._start(output_path, size, fps, audio, audio_fps, cmd, audio_path=audio_path,
+                    input_pixel_format=input_pixel_format)
+
+    def _start(self, output_path, size, fps, audio, audio_fps, output_args, audio_path=None,
+               input_pixel_format='rgb24'):
+        """Start ffmpeg with the video (input 0) and audio (input 1) pipes, then ``output_args``.
+
+        ``audio_path`` replaces the audio pipe by a file.
+        """
+        self.output_path = output_path
+        width, height = size
+        cmd = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo", "-s", "%dx%d" % (width, height),
+            "-pix_fmt", input_pixel_format, "-r", "%.02f" % fps, "-i", "-",
+        ]
+        pass_fds = ()
+        if audio is not None:
+            audio_read, audio_write = os.pipe()
+            pass_fds = (audio_read,)
+            cmd += ["-f", "f32le", "-ar", str(audio_fps), "-ac", str(audio.nchannels),
+                    "-i", "pipe:%d" % audio_read]
+        elif audio_path is not None:
+            cmd += ["-i", ffmpeg_escape_filename(audio_path)]
+        cmd += output_args
+
+        popen_params = cross_platform_popen_params(
+            {"stdout": sp.DEVNULL, "stderr": sp.PIPE, "stdin": sp.PIPE, "pass_fds": pass_fds}
+        )
+        try:
+            self.proc = sp.Popen(cmd, **popen_params)
+        except Exception:
+            if audio is not None:
+                os.close(audio_write)
+            raise
+        finally:
+            if audio is not None:
+                os.close(audio_read)
+
+        self._frames = FramePipe(self.proc.stdin, size, pixel_format=input_pixel_format)
+        self._broken = False
+        self._audio_errors = []
+        self._audio_thread = None
+        if audio is not None:
+            self._audio_thread = threading.Thread(
+                target=_feed_audio, args=(audio, audio_write, audio_fps, self._audio_errors),
+                daemon=True)
+            self._audio_thread.start()
+
+    def write_frame(self, frame):
+        if self._broken:
+            return
+        try:
+            self._frames.write(frame)
+        except BrokenPipeError:
+            # ffmpeg exited early, close() reports the reason from its stderr
+            self._broken = True
+
+    def close(self):
+        """Finish the file and raise IOError if ffmpeg failed."""
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._wait()
+        if self.proc.returncode:
+            raise IOError(f"ffmpeg failed to write {self.output_path}:\n{self._err}")
+        if self._audio_errors:
+            raise self._audio_errors[0]
+        return self.output_path
+
+    def kill(self):
+        self.proc.kill()
+        self._wait()
+
+    def _wait(self):
+        if self._audio_thread is not None:
+            self._audio_thread.join()
+        self._err = self.proc.stderr.read().decode("utf8", "replace")
+        self.proc.wait()
+
+
+def clip_audio(clip):
+    """The audio of ``clip``, cut to the clip's duration."""
+    audio = clip.audio
+    if audio is not None and (audio.duration is None or audio.duration > clip.duration):
+        audio = audio.with_duration(clip.duration)
+    return audio
+
+
+def write_streamed_videofile(clip, output_path, fps, codec='libx264', audio_codec='aac',
+                             bitrate=None, audio_bitrate=None, preset='medium',
+                             audio_fps=AUDIO_FPS, threads=None, pixel_format='yuv420p',
+                             ffmpeg_params=None, logger="bar", budget=None,
+                             input_pixel_format='rgb24'):
+    """Like ``clip.write_videofile`` but encodes audio and video in one ffmpeg pass.
+
+    ``write_videofile`` encodes the whole soundtrack to a temporary file
+    before the first frame is rendered. Here a StreamEncoder takes the frames
+    on stdin and the PCM samples through a second pipe, so the audio is
+    mixed and encoded while the frames are being composited.
+    A CpuBudget passed as ``budget`` sizes the encoder threads, and
+    ``input_pixel_format='yuv420p'`` takes I420 frames (see FramePipe).
+    """
+    if budget is not None:
+        ffmpeg_params = budget.encoder_params(codec, ffmpeg_params)
+    if clip.audio is not None and os.name == 'nt':
+        if input_pixel_format != 'rgb24':
+            raise ValueError("yuv420p frames need the audio pipe, which Windows doesn't have")
+        # Extra pipes can't be handed to the ffmpeg process on Windows
+        clip.write_videofile(output_path, fps=fps, codec=codec, audio_codec=audio_codec,
+                             bitrate=bitrate, audio_bitrate=audio_bitrate, preset=preset,
+                             audio_fps=audio_fps, threads=threads, ffmpeg_params=ffmpeg_params,
+                             logger=logger)
+        return output_path
+
+    encoder = StreamEncoder(output_path, clip.size, fps, clip_audio(clip), codec=codec,
+                            audio_codec=audio_codec, bitrate=bitrate, audio_bitrate=audio_bitrate,
+                            preset=preset, audio_fps=audio_fps, threads=threads,
+                            pixel_format=pixel_format, ffmpeg_params=ffmpeg_params,
+                            input_pixel_format=input_pixel_format)
+    try:
+        for frame in clip.iter_frames(fps=fps, logger=logger):
+            encoder.write_frame(frame)
+    except BaseException:
+        encoder.kill()
+        raise
+    return encoder.close()
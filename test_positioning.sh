@@ -8,7 +8,7 @@ if [ -f "motivational_video_with_video_bg_enhanced.mp4" ]; then
     file_size=$(stat -f%z "motivational_video_with_video_bg_enhanced.mp4" 2>/dev/null || stat -c%s "motivational_video_with_video_bg_enhanced.mp4" 2>/dev/null)
     echo "✅ Enhanced Video Background: CREATED"
     echo "   📁 File size: $(( file_size / 1024 / 1024 )) MB"
-    echo "   🎯 Text positioning: CENTER (fixed)"
+    echo "   🎯 Text positioning: brightness analysis (top/center/bottom)"
     echo "   🎨 Dark background: ENABLED"
     echo "   📊 Resolution: 1080x1920 HD"
 else
@@ -0,0 +1,32 @@
+import os
+
+from asset_index import AssetIndex
+
+
+def test_files_leaves_out_other_folders_of_a_shared_index(tmp_path):
+    index_file = str(tmp_path / "asset_index.json")
+    for folder in ("videos", "other_videos"):
+        (tmp_path / folder).mkdir()
+        # Unreadable, so listed with valid_only=False only, but indexed all the same
+        (tmp_path / folder / "clip.mp4").write_bytes(b"")
+
+    AssetIndex(index_file, folders={'video': str(tmp_path / "other_videos")}).refresh()
+    index = AssetIndex(index_file, folders={'video': str(tmp_path / "videos")})
+    index.refresh()
+
+    assert len(index.assets) == 2
+    assert index.files('video', valid_only=False) == [os.path.join(str(tmp_path / "videos"), "clip.mp4")]
+    assert index.files('music', valid_only=False) == []
+
+
+def test_one_entry_per_file_however_the_folder_is_spelled(tmp_path):
+    index_file = str(tmp_path / "asset_index.json")
+    (tmp_path / "videos").mkdir()
+    (tmp_path / "videos" / "clip.mp4").write_bytes(b"")
+
+    for folder in (str(tmp_path / "videos"), str(tmp_path / "videos") + "/./"):
+        AssetIndex(index_file, folders={'video': folder}).refresh()
+
+    index = AssetIndex(index_file)
+    assert list(index.assets) == [os.path.join(str(tmp_path / "videos"), "clip.mp4")]
+    assert index.get(str(tmp_path / "videos") + "/./clip.mp4") is not None
@@ -0,0 +1,72 @@
+import numpy as np
+from moviepy import ColorClip, VideoFileClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import subprocess_call
+
+from background_reader import BackgroundVideoClip
+from overlay_compositor import flatten_overlay
+from render_pipeline import write_pipelined_videofile
+
+
+def _overlay(size, duration):
+    box = ColorClip(size=(32, 16), color=(255, 0, 0)).with_opacity(0.5)
+    return flatten_overlay([box.with_duration(duration).with_position((8, 24))], size)
+
+
+def _background(tmp_path, fps, duration):
+    source = str(tmp_path / "background.mp4")
+    subprocess_call([FFMPEG_BINARY, "-y", "-loglevel", "error", "-f", "lavfi",
+                     "-i", f"testsrc=size=64x64:rate={fps}:duration={duration}",
+                     "-pix_fmt", "yuv420p", source], logger=None)
+    return source
+
+
+def _write_lossless(clip, output, fps):
+    # Lossless RGB, so the written frames are exactly the composed ones
+    write_pipelined_videofile(clip, output, fps=fps, codec='libx264rgb', pixel_format=None,
+                              ffmpeg_params=["-qp", "0"], logger=None, report=False)
+
+
+def test_pipelined_first_frame_is_blended_once(tmp_path):
+    source = _background(tmp_path, 10, 1)
+
+    background = BackgroundVideoClip(source, audio=False)
+    overlay = _overlay(background.size, background.duration)
+    clip = overlay.apply_to(background, in_place=True)
+
+    output = str(tmp_path / "output.mkv")
+    _write_lossless(clip, output, 10)
+
+    reference_clip = BackgroundVideoClip(source, audio=False)
+    reference = overlay.blend(reference_clip.get_frame(0))
+    written = VideoFileClip(output, audio=False)
+    try:
+        assert np.array_equal(written.get_frame(0), reference)
+        assert np.array_equal(written.get_frame(0), clip.get_frame(0))
+    finally:
+        written.close()
+        reference_clip.close()
+        background.close()
+
+
+def test_pipelined_frames_survive_skipped_source_frames(tmp_path):
+    # At 30 fps in and 10 fps out the reader skips two source frames per
+    # output frame, while the prefetch thread reads ahead into the ring
+    source = _background(tmp_path, 30, 3)
+    background = BackgroundVideoClip(source, audio=False, prefetch=4)
+    overlay = _overlay(background.size, background.duration)
+    clip = overlay.apply_to(background, in_place=True)
+
+    output = str(tmp_path / "output.mkv")
+    _write_lossless(clip, output, 10)
+
+    reference_clip = BackgroundVideoClip(source, audio=False)
+    written = VideoFileClip(output, audio=False)
+    try:
+        for i in range(30):
+            reference = overlay.blend(reference_clip.get_frame(i / 10))
+            assert np.array_equal(written.get_frame(i / 10), reference), f"frame {i}"
+    finally:
+        written.close()
+        reference_clip.close()
+        background.close()
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from moviepy import ImageClip, TextClip
+
+from disk_cache import evict_lru
+
+CACHE_DIR = os.path.join(".cache", "text")
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# Bitmaps already loaded by this process
+_memory = {}
+
+
+def _cache_key(text, font, font_size, color, stroke_color, stroke_width):
+    # A font file that changes on disk must not hit the old bitmaps
+    font_stamp = os.path.getmtime(font) if font and os.path.exists(font) else None
+    spec = [text, font, font_stamp, font_size, color, stroke_color, stroke_width]
+    return hashlib.sha1(json.dumps(spec).encode("utf-8")).hexdigest()
+
+
+def cached_text_clip(text, font=None, font_size=None, color='black', stroke_color=None,
+                     stroke_width=0, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Return a TextClip-equivalent ImageClip, rasterizing the text only once.
+
+    The rendered RGBA bitmap is kept on disk under ``cache_dir`` keyed by the
+    text and its styling, so repeated and batch runs skip PIL text layout.
+    The cache is capped at ``max_bytes``; the least recently used bitmaps
+    are evicted first.
+    """
+    key = _cache_key(text, font, font_size, color, stroke_color, stroke_width)
+    path = os.path.join(cache_dir, key + ".npy")
+
+    rgba = _memory.get(key)
+    if rgba is None and os.path.exists(path):
+        try:
+            rgba = np.load(path)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            rgba = None  # Half-written or evicted meanwhile, render it again
+
+    if rgba is None:
+        clip = TextClip(text=text, font=font, font_size=font_size, color=color,
+                        stroke_color=stroke_color, stroke_width=stroke_width)
+        # TextClip splits its RGBA picture into the image and a mask of alpha / 255
+        alpha = np.round(clip.mask.get_frame(0) * 255).astype(np.uint8)
+        rgba = np.dstack([clip.get_frame(0).astype(np.uint8), alpha])
+
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, rgba)
+        os.replace(tmp_path, path)
+        evict_lru(cache_dir, max_bytes, suffix=".npy")
+
+    _memory[key] = rgba
+    # Same construction as TextClip: the alpha channel becomes the mask
+    return ImageClip(rgba)
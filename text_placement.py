@@ -0,0 +1,77 @@
+import hashlib
+import os
+import subprocess as sp
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import cross_platform_popen_params, ffmpeg_escape_filename
+
+from disk_cache import load_json, store_json_entry
+
+CACHE_FILE = os.path.join(".cache", "text_placement.json")
+
+# Brightness per third of the frame does not need more than a thumbnail
+THUMBNAIL_SIZE = (36, 64)
+
+
+def sample_thumbnails(path, start, duration, sample_points=5, size=THUMBNAIL_SIZE):
+    """Decode ``sample_points`` evenly spaced thumbnails of ``path`` in one pass.
+
+    A single ffmpeg process reads the window once, keeps ``sample_points``
+    frames with the fps filter and scales them to ``size`` before they are
+    piped, instead of seeking and piping full resolution frames.
+    """
+    w, h = size
+    cmd = [
+        FFMPEG_BINARY, "-loglevel", "error",
+        "-ss", "%.06f" % start, "-t", "%.06f" % duration,
+        "-i", ffmpeg_escape_filename(path),
+        "-an", "-vf", "fps=%.06f,scale=%d:%d" % (sample_points / duration, w, h),
+        "-frames:v", str(sample_points),
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-",
+    ]
+    popen_params = cross_platform_popen_params(
+        {"stdout": sp.PIPE, "stderr": sp.PIPE, "stdin": sp.DEVNULL}
+    )
+    proc = sp.Popen(cmd, **popen_params)
+    out, err = proc.communicate()
+    if proc.returncode:
+        raise IOError(err.decode("utf8"))
+
+    frames = np.frombuffer(out, dtype=np.uint8)
+    return frames[: len(frames) // (w * h * 3) * (w * h * 3)].reshape(-1, h, w, 3)
+
+
+def region_brightness(frames):
+    """Average brightness of the top, center and bottom thirds of ``frames``."""
+    h = frames.shape[1]
+    return {
+        'top': float(frames[:, :h//3].mean()),
+        'center': float(frames[:, h//3:2*h//3].mean()),
+        'bottom': float(frames[:, 2*h//3:].mean()),
+    }
+
+
+def analyze_brightness(path, start, duration, sample_points=5, cache_file=CACHE_FILE):
+    """Return the region brightness of a background window, cached per file.
+
+    Results are stored in ``cache_file`` keyed by the file's identity
+    (path, size, mtime) and the analysed window, so a background is only
+    analysed the first time it is used.
+    """
+    stat = os.stat(path)
+    spec = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{start}|{duration}|{sample_points}"
+    key = hashlib.sha1(spec.encode("utf-8")).hexdigest()
+
+    cache = load_json(cache_file)
+    if key in cache:
+        return cache[key]
+
+    frames = sample_thumbnails(path, start, duration, sample_points)
+    if not len(frames):
+        raise IOError(f"No frames could be decoded from {path}")
+    brightness = region_brightness(frames)
+
+    store_json_entry(cache_file, key, brightness)
+
+    return brightness
@@ -0,0 +1,144 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import proglog
+
+import create_video_with_video_bg_enhanced as reel_script
+from background_reader import PREFETCH_FRAMES
+from cpu_budget import CpuBudget, reader_options, split_budget
+from reel_assets import AssetCache
+from streamed_export import AUDIO_FPS, StreamEncoder
+
+
+def variant_path(output_path, number):
+    """``reel.mp4`` -> ``reel_01.mp4``."""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_{number:02d}{ext or '.mp4'}"
+
+
+def render_variants(background_video_path, music_path, proverbs, output_path=reel_script.output_path,
+                    assets=None, max_duration=None, logger="bar", budget=None):
+    """Render one enhanced video-bg reel per proverb over the same background in a single pass.
+
+    Every background frame is decoded and resized once. For each proverb
+    its overlay is blended into a scratch copy of the frame, which is piped
+    to that variant's encoder, then only the overlay's dirty rectangles are
+    restored from the decoded frame for the next variant. The soundtrack is
+    the same for all variants, so it is encoded once and muxed into every
+    file by stream copy. ``budget`` is shared between the encoders.
+
+    Returns the written files, named after ``output_path`` with a number.
+    """
+    own_assets = assets is None
+    if own_assets:
+        assets = AssetCache(videos_folder=reel_script.videos_folder,
+                            music_folder=reel_script.music_folder,
+                            proverbs_file=reel_script.proverbs_file)
+
+    if max_duration is None:
+        max_duration = reel_script.max_duration
+    background_clip = assets.video(background_video_path, width=1080, upscale=False,
+                                   **reader_options(budget, PREFETCH_FRAMES))
+    final_duration = min(max_duration, background_clip.duration)
+    background_clip = background_clip.subclipped(0, final_duration)
+    size = background_clip.size
+
+    # The placement only depends on the background, so all variants share it
+    position = reel_script.analyze_video_for_text_placement(background_video_path, 0, final_duration)
+    print(f"Text will be positioned at: {position[1]:.0%} of the height")
+    overlays = [reel_script.create_text_overlay(proverb, final_duration, size, position)[0]
+                for proverb in proverbs]
+    audio = reel_script.process_audio_for_video(music_path, final_duration, background_clip.audio,
+                                                assets=assets)
+
+    settings = reel_script.pick_export_settings(size[0])
+    fps = settings['fps']
+    encoder_budget = split_budget(budget, len(proverbs))
+    ffmpeg_params = None
+    if encoder_budget is not None:
+        ffmpeg_params = encoder_budget.encoder_params(settings['codec'])
+    output_paths = [variant_path(output_path, i + 1) for i in range(len(proverbs))]
+    print(f"🎬 Rendering {len(proverbs)} variant(s) of {final_duration:.1f}s from one decode")
+
+    work_dir = tempfile.mkdtemp(prefix="reel_variants_")
+    encoders = []
+    try:
+        audio_path = None
+        if audio is not None:
+            audio_path = os.path.join(work_dir, "audio.m4a")
+            audio.with_duration(final_duration).write_audiofile(
+                audio_path, fps=AUDIO_FPS, codec=settings['audio_codec'], logger=None)
+
+        for path in output_paths:
+            encoders.append(StreamEncoder(path, size, fps, codec=settings['codec'],
+                                          bitrate=settings.get('bitrate'),
+                                          preset=settings.get('preset', 'medium'),
+                                          ffmpeg_params=ffmpeg_params, audio_path=audio_path))
+
+        w, h = size
+        work = np.empty((h, w, 3), dtype=np.uint8)
+        for i in proglog.default_bar_logger(logger).iter_bar(frame_index=range(int(final_duration * fps))):
+            frame = background_clip.get_frame(i / fps)
+            np.copyto(work, frame[:, :, :3])
+            for overlay, encoder in zip(overlays, encoders):
+                overlay.blend(work, out=work)
+                # The pipe write is done when it returns, so work can be reused
+                encoder.write_frame(work)
+                for region in overlay.regions:
+                    x0, y0, x1, y1 = region.box
+                    np.copyto(work[y0:y1, x0:x1], frame[y0:y1, x0:x1, :3])
+
+        for encoder in encoders:
+            encoder.close()
+    except BaseException:
+        for encoder in encoders:
+            encoder.kill()
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        # The background video and music readers are owned by the asset cache
+        if own_assets:
+            assets.close()
+
+    for proverb, path in zip(proverbs, output_paths):
+        print(f"   {path}: {proverb}")
+    return output_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render several enhanced video-background reels with different proverbs "
+                    "over one background, decoding it once.")
+    parser.add_argument('--count', type=int, default=10,
+                        help="number of proverbs / reels (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=reel_script.max_duration,
+                        help="longest reel length in seconds (default: %(default)s)")
+    parser.add_argument('--output', default=reel_script.output_path,
+                        help="output file name, numbered per variant (default: %(default)s)")
+    parser.add_argument('--cpus', type=int, default=0,
+                        help="CPU cores the render may use, 0 for all of them (default: 0)")
+    args = parser.parse_args()
+
+    with AssetCache(videos_folder=reel_script.videos_folder, music_folder=reel_script.music_folder,
+                    proverbs_file=reel_script.proverbs_file) as assets:
+        background_video_path, music_path, _ = reel_script.pick_inputs(assets)
+        all_proverbs = assets.proverbs()
+        proverbs = random.sample(all_proverbs, min(args.count, len(all_proverbs)))
+        print(f"Using background video: {background_video_path}")
+        print(f"Using music: {music_path}")
+
+        started = time.time()
+        output_paths = render_variants(background_video_path, music_path, proverbs, args.output,
+                                       assets=assets, max_duration=args.duration,
+                                       budget=CpuBudget(args.cpus) if args.cpus else None)
+    print(f"{len(output_paths)} videos saved in {time.time() - started:.1f} seconds")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())